@@ -0,0 +1,279 @@
+"""
+Benchmarks of the simulation core at scaling population sizes, e.g.
+
+    python -m benchmarks run --out before.json
+    python -m benchmarks run --out after.json
+    python -m benchmarks compare before.json after.json
+
+Every case starts from an Environment with a fixed seed and is restored to
+the same state before each timed call, so results are comparable between
+commits on the same machine.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from environment import Environment, EnvironmentSnapshot
+from kernels import KERNEL_NAMES
+from organisms import Organisms
+
+SEED = 0
+POPULATION_SIZES = (10, 100, 1000, 10000, 100000)
+# Food items in the unit square
+FOOD_DENSITIES = (100, 1000)
+REGRESSION_THRESHOLD = 0.2
+
+
+class Benchmark:
+    """
+    setup() runs untimed before every call of run(). A case is sampled at
+    least MIN_SAMPLES times and until MIN_SECONDS of timed calls have been
+    recorded or MAX_SAMPLES is reached.
+    """
+    MIN_SAMPLES = 3
+    MAX_SAMPLES = 200
+    MIN_SECONDS = 0.5
+
+    name = None
+
+    def __init__(self, number_of_blobs, food_density, spatial_index="grid", kernels="numpy"):
+        self.parameters = {'blobs': number_of_blobs, 'food': food_density, 'spatial_index': spatial_index}
+        self.environment = Environment(number_of_blobs=number_of_blobs, starting_food_items=food_density,
+                                       spatial_index=spatial_index, seed=SEED, kernels=kernels)
+        self.state = self.environment.get_state()
+
+    def setup(self):
+        self.environment.set_state(self.state)
+
+    def run(self):
+        raise NotImplementedError
+
+    def measure(self):
+        samples = []
+        while len(samples) < Benchmark.MAX_SAMPLES and \
+                (len(samples) < Benchmark.MIN_SAMPLES or sum(samples) < Benchmark.MIN_SECONDS):
+            self.setup()
+            start = time.perf_counter()
+            self.run()
+            samples += [time.perf_counter() - start]
+        samples = np.array(samples)
+        return {
+            'benchmark': self.name,
+            'parameters': self.parameters,
+            'samples': len(samples),
+            'median': float(np.median(samples)),
+            'min': float(samples.min()),
+            'iqr': float(np.subtract(*np.percentile(samples, [75, 25])))
+        }
+
+
+class IterateBenchmark(Benchmark):
+    name = "iterate"
+
+    def run(self):
+        self.environment.iterate()
+
+
+class SpatialIndexBuildBenchmark(Benchmark):
+    name = "spatial_index_build"
+
+    def run(self):
+        self.environment.organisms.rebuild_spatial_index()
+
+
+class SpatialIndexQueryBenchmark(Benchmark):
+    name = "spatial_index_query"
+
+    def run(self):
+        foodage = self.environment.foodage
+        self.environment.organisms.spatial_index.candidate_pairs(foodage.get_positions(), foodage.get_radii())
+
+
+class FoodConsumptionBenchmark(Benchmark):
+    name = "food_consumption"
+
+    def run(self):
+        self.environment.process_food_consumption()
+
+
+class ReproductionBenchmark(Benchmark):
+    """
+    Every organism has exactly enough energy for one offspring.
+    """
+    name = "reproduction"
+
+    def setup(self):
+        super().setup()
+        population = self.environment.organisms.population
+        population.energy = population.next_energy_requirement + population.starting_energy
+
+    def run(self):
+        self.environment.organisms.population.produce_offspring(self.environment.current_time)
+
+
+class ViewDataBenchmark(Benchmark):
+    """
+    Snapshotting the environment and preparing the columns EnvironmentView
+    sends to the browser. Needs bokeh.
+    """
+    name = "view_data"
+
+    def run(self):
+        from gui_components import EnvironmentView
+        snapshot = EnvironmentSnapshot(self.environment)
+        EnvironmentView.make_blobs_data(snapshot)
+        EnvironmentView.make_eyes_data(snapshot)
+        EnvironmentView.make_food_data(snapshot)
+
+
+def make_benchmarks(sizes=POPULATION_SIZES, food_densities=FOOD_DENSITIES):
+    """
+    Every (benchmark class, constructor arguments) case, cheapest first.
+    """
+    cases = []
+    for number_of_blobs in sizes:
+        for food_density in food_densities:
+            for spatial_index in Organisms.SPATIAL_INDICES:
+                cases += [(SpatialIndexBuildBenchmark, (number_of_blobs, food_density, spatial_index)),
+                          (SpatialIndexQueryBenchmark, (number_of_blobs, food_density, spatial_index))]
+            cases += [(FoodConsumptionBenchmark, (number_of_blobs, food_density)),
+                      (IterateBenchmark, (number_of_blobs, food_density)),
+                      (ReproductionBenchmark, (number_of_blobs, food_density)),
+                      (ViewDataBenchmark, (number_of_blobs, food_density))]
+    return cases
+
+
+def get_gui_import_error():
+    try:
+        import gui_components
+    except Exception as error:  # bokeh missing, or incompatible with the installed numpy
+        return error
+    return None
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(cases, benchmark_names=None, output_function=print, kernels="numpy"):
+    results = []
+    gui_import_error = get_gui_import_error()
+    for benchmark_class, arguments in cases:
+        if benchmark_names is not None and benchmark_class.name not in benchmark_names:
+            continue
+        if benchmark_class is ViewDataBenchmark and gui_import_error is not None:
+            continue
+        result = benchmark_class(*arguments, kernels=kernels).measure()
+        results += [result]
+        output_function(format_result(result))
+    if gui_import_error is not None:
+        output_function("Skipped view_data: could not import the GUI (" + repr(gui_import_error) + ")")
+    return {
+        'commit': get_commit(),
+        'machine': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'kernels': kernels,
+        'seed': SEED,
+        'results': results
+    }
+
+
+def get_key(result):
+    return result['benchmark'], json.dumps(result['parameters'], sort_keys=True)
+
+
+def format_result(result):
+    return "{:<22}{:<60}{:>12.3f} ms  ({} samples, IQR {:.3f} ms)".format(
+        result['benchmark'], json.dumps(result['parameters'], sort_keys=True), 1000 * result['median'],
+        result['samples'], 1000 * result['iqr'])
+
+
+def compare_results(baseline: dict, contender: dict, threshold=REGRESSION_THRESHOLD):
+    """
+    Rows of (benchmark, parameters, baseline median, contender median, ratio,
+    is_regression) for every case in both result sets. A case regresses when
+    its median is more than threshold slower and the slowdown exceeds the
+    baseline's interquartile range.
+    """
+    baseline_results = {get_key(result): result for result in baseline['results']}
+    rows = []
+    for result in contender['results']:
+        key = get_key(result)
+        if key not in baseline_results:
+            continue
+        old = baseline_results[key]
+        ratio = result['median'] / old['median']
+        is_regression = ratio > 1 + threshold and result['median'] - old['median'] > old['iqr']
+        rows += [(key[0], key[1], old['median'], result['median'], ratio, is_regression)]
+    return rows
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Simulation core benchmarks")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--out", default=None, help="JSON file to write the results to")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=list(POPULATION_SIZES),
+                            help="numbers of organisms")
+    run_parser.add_argument("--food", type=int, nargs="+", default=list(FOOD_DENSITIES),
+                            help="food items in the unit square")
+    run_parser.add_argument("--only", nargs="+", default=None,
+                            choices=sorted({benchmark_class.name for benchmark_class, _ in make_benchmarks()}),
+                            help="benchmarks to run")
+    run_parser.add_argument("--kernels", choices=list(KERNEL_NAMES), default="numpy",
+                            help="implementation of the inner loops to time")
+    run_parser.set_defaults(function=run)
+
+    compare_parser = subparsers.add_parser("compare", help="flag regressions between two result files")
+    compare_parser.add_argument("baseline", help="results of the earlier commit")
+    compare_parser.add_argument("contender", help="results of the later commit")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                                help="relative slowdown of the median that counts as a regression")
+    compare_parser.set_defaults(function=compare)
+    return parser
+
+
+def run(arguments):
+    results = run_benchmarks(make_benchmarks(arguments.sizes, arguments.food), arguments.only,
+                             kernels=arguments.kernels)
+    if arguments.out is not None:
+        with open(arguments.out, 'w') as results_file:
+            json.dump(results, results_file, indent=1)
+
+
+def compare(arguments):
+    with open(arguments.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(arguments.contender) as contender_file:
+        contender = json.load(contender_file)
+    if baseline['machine'] != contender['machine']:
+        print("Warning: results come from different machines", file=sys.stderr)
+
+    rows = compare_results(baseline, contender, arguments.threshold)
+    for benchmark, parameters, old, new, ratio, is_regression in rows:
+        print("{:<22}{:<60}{:>12.3f}{:>12.3f} ms {:>7.2f}x{}".format(
+            benchmark, parameters, 1000 * old, 1000 * new, ratio, "  REGRESSION" if is_regression else ""))
+    regressions = sum(row[-1] for row in rows)
+    print("{} of {} cases regressed ({} -> {})".format(regressions, len(rows), baseline['commit'],
+                                                      contender['commit']))
+    if regressions:
+        sys.exit(1)
+
+
+def main(argv=None):
+    arguments = make_parser().parse_args(argv)
+    arguments.function(arguments)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,17 @@
-from random import random
 import numpy as np
-import math
+from column_store import SlotMap
 from quad_tree import Rectangle
 
 
 class Blob:
+    """
+    View of a single organism stored in a Population, by its handle, so it
+    stays valid while the organism is alive however the rows move.
+    """
 
     MASS_TO_RADIUS_SQUARED = 1000
     ENERGY_FOR_RADIUS_SQUARED_PRODUCTION = 1
-    
+
     SPEED_EXTREMA = {
         "maximum": 0.08,
         "minimum": 0.0001
@@ -27,46 +30,80 @@ class Blob:
         "starting_energy": 0.1
     }
 
-    NUMBER_OF_BLOBS = 0
+    def __init__(self, population, handle):
+        self.population = population
+        self.handle = handle
+
+    @property
+    def index(self):
+        return self.population.get_row(self.handle)
+
+    @property
+    def id(self):
+        return int(self.population.id[self.index])
+
+    @property
+    def parent_id(self):
+        return int(self.population.parent_id[self.index])
+
+    @property
+    def founder_id(self):
+        return int(self.population.founder_id[self.index])
+
+    @property
+    def position(self):
+        return self.population.position[self.index]
+
+    @property
+    def angle(self):
+        return self.population.angle[self.index]
+
+    @property
+    def speed(self):
+        return self.population.speed[self.index]
+
+    @property
+    def radius(self):
+        return self.population.radius[self.index]
 
-    def __init__(self, time_of_birth=0, angle=None, speed=None, position=None, energy=None, radius=None):
+    @property
+    def energy(self):
+        return self.population.energy[self.index]
 
-        self.time_of_birth = time_of_birth
-        self.time_of_death = None
+    @energy.setter
+    def energy(self, energy):
+        self.population.energy[self.index] = energy
 
-        self.id = Blob.NUMBER_OF_BLOBS
-        Blob.NUMBER_OF_BLOBS += 1
-        self.eye_width = 0.5*random() + 0.3
-        if position is None:
-            self.position = np.array(np.random.rand(2))
-        else:
-            self.position = position
+    @property
+    def starting_energy(self):
+        return self.population.starting_energy[self.index]
 
-        if angle is None:
-            self.angle = random() * 2 * math.pi
-        else:
-            self.angle = angle
+    @property
+    def eye_width(self):
+        return self.population.eye_width[self.index]
 
-        if speed is None:
-            self.speed = Blob.SPEED_EXTREMA["minimum"] + \
-                         random() * (Blob.SPEED_EXTREMA["maximum"] - Blob.SPEED_EXTREMA["minimum"])
-        else:
-            self.speed = min(Blob.SPEED_EXTREMA["maximum"], max(speed, Blob.SPEED_EXTREMA["minimum"]))
+    @property
+    def time_of_birth(self):
+        return int(self.population.time_of_birth[self.index])
 
-        if radius is None:
-            self.radius = Blob.RADIUS_EXTREMA["minimum"] + \
-                          random() * (Blob.RADIUS_EXTREMA["maximum"] - Blob.RADIUS_EXTREMA["minimum"])
-        else:
-            self.radius = min(Blob.RADIUS_EXTREMA["maximum"], max(radius, Blob.RADIUS_EXTREMA["minimum"]))
+    @property
+    def time_of_death(self):
+        if not self.is_dead():
+            return None
+        return int(self.population.time_of_death[self.index])
 
-        if energy is None:
-            self.energy = Blob.DEFAULT_STARTING_ENERGY_PER_RADIUS_SQUARED * self.radius ** 2
-        else:
-            self.energy = energy
-        self.starting_energy = self.energy
+    @property
+    def next_offspring_data(self):
+        return {
+            "speed": self.population.next_speed[self.index],
+            "radius": self.population.next_radius[self.index],
+            "energy": self.population.next_energy[self.index],
+            "energy_requirement": self.population.next_energy_requirement[self.index]
+        }
 
-        self.bounding_box = self.make_bounding_box()
-        self.next_offspring_data = self.make_next_offspring_data()
+    @property
+    def bounding_box(self):
+        return self.make_bounding_box()
 
     def make_bounding_box(self):
         return Rectangle(
@@ -76,43 +113,21 @@ class Blob:
             height=2 * self.radius
         )
 
-    def move_one_step(self):
-        self.position += self.speed * self.get_velocity()
-        self.position -= np.floor(self.position)
-        self.bounding_box = self.make_bounding_box()
-
     def get_velocity(self):
         return self.speed * np.array([np.cos(self.angle), np.sin(self.angle)])
 
-    def perturb_angle(self):
-        self.angle += np.random.normal(0, Blob.ANGLE_PERTURBATION_RATE) * self.speed
-
     def change_energy(self, delta):
         self.energy += delta
 
     def eat_food(self, food):
         self.energy += food.energy
 
-    def update(self, current_time: int):
-        self.move_one_step()
-        self.perturb_angle()
-        self.change_energy(-0.5 * self.speed * self.speed * self.get_mass())
-        if self.energy <= 0:
-            self.time_of_death = current_time
-
-    def produce_offspring(self, current_time: int):
-        offspring = []
-        while self.energy >= self.next_offspring_data["energy_requirement"] + self.starting_energy:
-            offspring += [self.make_the_baby(current_time)]
-            self.energy -= self.next_offspring_data["energy_requirement"]
-            self.next_offspring_data = self.make_next_offspring_data()
-        return offspring
-
     def get_capacity_for_birth(self):
         return self.energy / (self.next_offspring_data["energy_requirement"] + self.starting_energy)
 
     def is_dead(self):
-        return not (self.time_of_death is None)
+        row = self.population.get_rows(self.handle)
+        return bool(row == SlotMap.NO_ROW or self.population.time_of_death[row] != self.population.NOT_DEAD)
 
     def get_mass(self):
         return self.radius ** 2 * Blob.MASS_TO_RADIUS_SQUARED
@@ -126,37 +141,16 @@ class Blob:
     def get_y_coordinate(self):
         return self.position[1]
 
-    def make_next_offspring_data(self):
-        next_radius = max(
-            np.random.normal(self.radius, Blob.MUTATION_PARAMETERS["radius"]*self.radius)
-            , Blob.RADIUS_EXTREMA['minimum']
-                        )
-        next_starting_energy = max(np.random.normal(self.starting_energy,
-                                                Blob.MUTATION_PARAMETERS["starting_energy"]*self.starting_energy),0)
-        return {
-            "speed": np.random.normal(self.speed, Blob.MUTATION_PARAMETERS["speed"]*self.speed),
-            "radius": next_radius,
-            "energy": next_starting_energy,
-            "energy_requirement": Blob.reproduction_energy_requirement(next_starting_energy, next_radius)
-        }
-
     @staticmethod
     def reproduction_energy_requirement(offspring_starting_energy, offspring_radius):
         return offspring_starting_energy + \
                Blob.ENERGY_FOR_RADIUS_SQUARED_PRODUCTION * offspring_radius ** 2
 
-    def make_the_baby(self, birth_time):
-        return Blob(
-            time_of_birth=birth_time,
-            speed=self.next_offspring_data["speed"],
-            position=self.position.copy(),
-            energy=self.next_offspring_data["energy"],
-            radius=self.next_offspring_data["radius"]
-        )
+    def __eq__(self, other):
+        return isinstance(other, Blob) and self.population is other.population and self.handle == other.handle
 
-    def restrict_to_extrema(self):
-        self.speed = min(Blob.SPEED_EXTREMA["maximum"], max(self.speed, Blob.SPEED_EXTREMA["minimum"]))
-        self.radius = min(Blob.RADIUS_EXTREMA["maximum"], max(self.radius, Blob.RADIUS_EXTREMA["minimum"]))
+    def __hash__(self):
+        return hash((id(self.population), self.handle))
 
     def __str__(self):
         return "<Blob #" + str(self.id) + ">"
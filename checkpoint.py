@@ -0,0 +1,27 @@
+from environment import Environment
+
+
+class Checkpointer:
+    """
+    Saves an Environment to the same path every `interval` time steps.
+    Call after_iteration once a call to Environment.iterate has returned,
+    or let advance run the environment.
+    """
+
+    def __init__(self, path, interval=1000):
+        self.path = path
+        self.interval = interval
+
+    def after_iteration(self, environment: Environment):
+        if environment.current_time % self.interval == 0:
+            environment.save(self.path)
+
+    def advance(self, environment: Environment, number_of_steps, sampling_interval=1):
+        """
+        Environment.advance, stopping on every checkpoint step to save.
+        """
+        end_time = environment.current_time + number_of_steps
+        while environment.current_time < end_time:
+            steps_to_checkpoint = self.interval - environment.current_time % self.interval
+            environment.advance(min(steps_to_checkpoint, end_time - environment.current_time), sampling_interval)
+            self.after_iteration(environment)
@@ -0,0 +1,182 @@
+from copy import deepcopy
+import numpy as np
+
+
+class Column:
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, store, owner=None):
+        if store is None:
+            return self
+        return store.columns[self.name][:store.size]
+
+    def __set__(self, store, values):
+        store.columns[self.name][:store.size] = values
+
+
+class SlotMap:
+    """
+    Stable integer handles for rows that move whenever their store is
+    compacted. A handle packs a slot and the slot's generation; removing a
+    row frees its slot for reuse under the next generation, so stale
+    handles are detected instead of silently naming another row.
+    Allocating, looking up and releasing are O(1) per handle.
+    """
+    INITIAL_CAPACITY = 64
+    GENERATION_SHIFT = 32
+    SLOT_MASK = (1 << GENERATION_SHIFT) - 1
+    NO_ROW = -1
+
+    def __init__(self):
+        self.number_of_slots = 0
+        self.number_of_free_slots = 0
+        self.row_of_slot = np.full(SlotMap.INITIAL_CAPACITY, SlotMap.NO_ROW, dtype=np.int64)
+        self.generation = np.zeros(SlotMap.INITIAL_CAPACITY, dtype=np.int64)
+        self.free_slots = np.zeros(SlotMap.INITIAL_CAPACITY, dtype=np.int64)
+
+    def reserve(self, required_slots):
+        capacity = len(self.row_of_slot)
+        if required_slots <= capacity:
+            return
+        new_capacity = max(required_slots, 2 * capacity)
+        self.row_of_slot = np.concatenate((self.row_of_slot,
+                                           np.full(new_capacity - capacity, SlotMap.NO_ROW, dtype=np.int64)))
+        self.generation = np.concatenate((self.generation, np.zeros(new_capacity - capacity, dtype=np.int64)))
+        self.free_slots = np.concatenate((self.free_slots, np.zeros(new_capacity - capacity, dtype=np.int64)))
+
+    def allocate(self, rows):
+        """
+        Handles for new rows, reusing the most recently freed slots first.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        number_reused = min(len(rows), self.number_of_free_slots)
+        reused_slots = self.free_slots[self.number_of_free_slots - number_reused:self.number_of_free_slots][::-1]
+        self.number_of_free_slots -= number_reused
+
+        number_new = len(rows) - number_reused
+        self.reserve(self.number_of_slots + number_new)
+        new_slots = np.arange(self.number_of_slots, self.number_of_slots + number_new)
+        self.number_of_slots += number_new
+
+        slots = np.concatenate((reused_slots, new_slots))
+        self.row_of_slot[slots] = rows
+        return slots | (self.generation[slots] << SlotMap.GENERATION_SHIFT)
+
+    def release(self, handles):
+        slots = np.asarray(handles, dtype=np.int64) & SlotMap.SLOT_MASK
+        self.row_of_slot[slots] = SlotMap.NO_ROW
+        self.generation[slots] += 1
+        self.free_slots[self.number_of_free_slots:self.number_of_free_slots + len(slots)] = slots
+        self.number_of_free_slots += len(slots)
+
+    def relocate(self, handles, rows):
+        self.row_of_slot[np.asarray(handles, dtype=np.int64) & SlotMap.SLOT_MASK] = rows
+
+    def get_row(self, handle):
+        """
+        Raises KeyError if the handle's row has been removed.
+        """
+        slot = handle & SlotMap.SLOT_MASK
+        if slot >= self.number_of_slots or self.generation[slot] != handle >> SlotMap.GENERATION_SHIFT:
+            raise KeyError("Stale handle " + str(handle))
+        return int(self.row_of_slot[slot])
+
+    def get_rows(self, handles):
+        """
+        Rows of many handles at once, NO_ROW for stale ones.
+        """
+        handles = np.asarray(handles, dtype=np.int64)
+        slots = handles & SlotMap.SLOT_MASK
+        in_range = slots < self.number_of_slots
+        slots = np.where(in_range, slots, 0)
+        valid = in_range & (self.generation[slots] == handles >> SlotMap.GENERATION_SHIFT)
+        return np.where(valid, self.row_of_slot[slots], SlotMap.NO_ROW)
+
+
+class ColumnStore:
+    """
+    Rows of named NumPy columns, declared in COLUMN_TYPES and exposed through
+    Column descriptors, with amortised O(1) appends. Every row gets a stable
+    handle from a SlotMap. Rows are removed by compacting in one batch with
+    keep, so per-item deletions should only mark rows and leave the
+    compaction to the end of the tick.
+    """
+    INITIAL_CAPACITY = 64
+    COLUMN_TYPES = {}
+
+    handle = Column()
+
+    def __init__(self):
+        self.size = 0
+        self.slot_map = SlotMap()
+        column_types = dict(self.COLUMN_TYPES, handle=(np.int64, ()))
+        self.columns = {
+            name: np.zeros((ColumnStore.INITIAL_CAPACITY,) + shape, dtype=dtype)
+            for name, (dtype, shape) in column_types.items()
+        }
+
+    def __len__(self):
+        return self.size
+
+    def capacity(self):
+        return len(self.columns["handle"])
+
+    def reserve(self, required_size):
+        if required_size <= self.capacity():
+            return
+        new_capacity = max(required_size, 2 * self.capacity())
+        for name, column in self.columns.items():
+            grown = np.zeros((new_capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def append_rows(self, number_of_rows):
+        """
+        Slice of number_of_rows new rows at the end, with fresh handles and
+        every other column left for the caller to fill in.
+        """
+        start = self.size
+        self.reserve(start + number_of_rows)
+        self.size = start + number_of_rows
+        new = slice(start, self.size)
+        self.columns["handle"][new] = self.slot_map.allocate(np.arange(start, self.size))
+        return new
+
+    def keep(self, mask):
+        if mask.all():
+            return
+        self.slot_map.release(self.handle[~mask])
+        first_moved = int(np.argmin(mask))
+        kept = int(np.count_nonzero(mask))
+        for column in self.columns.values():
+            column[:kept] = column[:self.size][mask]
+        self.size = kept
+        self.slot_map.relocate(self.handle[first_moved:], np.arange(first_moved, kept))
+
+    def get_row(self, handle):
+        return self.slot_map.get_row(handle)
+
+    def get_rows(self, handles):
+        return self.slot_map.get_rows(handles)
+
+    def copy_handles(self, store):
+        """
+        Gives the rows of a copy of store the same handles as in store.
+        """
+        self.slot_map = deepcopy(store.slot_map)
+        self.handle = store.handle
+
+    def get_state(self):
+        """
+        Every column but the handles, which only identify rows within a run.
+        """
+        return {name: column[:self.size].copy() for name, column in self.columns.items() if name != "handle"}
+
+    def set_state(self, state: dict):
+        self.slot_map = SlotMap()
+        self.size = 0
+        new = self.append_rows(len(state[next(iter(self.COLUMN_TYPES))]))
+        for name in self.columns:
+            if name != "handle":
+                self.columns[name][new] = state[name]
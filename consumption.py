@@ -0,0 +1,49 @@
+import numpy as np
+from kernels import NO_EATER, NumpyKernels
+from profiler import NullProfiler
+from spatial_index import expand_ranges
+
+
+def candidate_pairs(food_positions, food_radii, organism_positions, organism_radii, periodic=False):
+    """
+    Sweep along x: pairs every food with each organism whose x coordinate is
+    within reach of it. When periodic, organisms are also looked for one
+    period either side. Returns (food indices, organism indices).
+    """
+    if len(food_radii) == 0 or len(organism_radii) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+
+    order = np.argsort(organism_positions[:, 0], kind="stable")
+    sorted_x = organism_positions[order, 0]
+    if periodic:
+        sorted_x = np.concatenate((sorted_x - 1, sorted_x, sorted_x + 1))
+        order = np.tile(order, 3)
+    reach = food_radii + organism_radii.max()
+    lower = np.searchsorted(sorted_x, food_positions[:, 0] - reach, side="left")
+    upper = np.searchsorted(sorted_x, food_positions[:, 0] + reach, side="right")
+    food_indices, sorted_indices = expand_ranges(lower, upper - lower)
+    return food_indices, order[sorted_indices]
+
+
+def find_eaters(food_positions, food_radii, organism_positions, organism_radii, spatial_index=None,
+                periodic=False, profiler=NullProfiler(), food_index=None, kernels=NumpyKernels):
+    """
+    For each food, the lowest-indexed organism that is larger than it and
+    overlaps it, or NO_EATER. If given, spatial_index must hold the organisms
+    as integer indices and is used in place of the x-axis sweep. If
+    food_index, holding the food, is given too, whichever of the two sides
+    is smaller is queried against the index of the other. Periodic overlap
+    is measured with minimum-image distances on the unit torus. Pairs are
+    resolved by kernels.resolve_eaters.
+    """
+    if food_index is not None and len(organism_radii) < len(food_radii):
+        organism_indices, food_indices = food_index.candidate_pairs(organism_positions, organism_radii)
+    elif spatial_index is None:
+        food_indices, organism_indices = candidate_pairs(food_positions, food_radii,
+                                                         organism_positions, organism_radii, periodic)
+    else:
+        food_indices, organism_indices = spatial_index.candidate_pairs(food_positions, food_radii)
+    profiler.count('candidate_pairs', len(food_indices))
+    return kernels.resolve_eaters(food_positions, food_radii, organism_positions, organism_radii,
+                                  food_indices, organism_indices, periodic)
@@ -1,9 +1,9 @@
+import time
 from environment import Environment
-from bokeh.models import RangeSlider, Slider, Tabs, Panel, Button
+from profiler import TickProfiler
+from bokeh.models import RangeSlider, Slider, Tabs, Panel, Button, Div
 from bokeh.layouts import column
-from blob import Blob
 from components import Component
-from foodage import Foodage
 
 
 class Tab(Component):
@@ -24,34 +24,128 @@ class PausePlayControlFunctions:
         self.is_playing_function = is_playing_function
 
 
-class ControlPanel(Component):
+class SpeedControlFunctions:
+    def __init__(self, get_steps_per_frame_function, set_steps_per_frame_function):
+        self.get_steps_per_frame_function = get_steps_per_frame_function
+        self.set_steps_per_frame_function = set_steps_per_frame_function
+
+
+class SkipForwardControlFunctions:
+    def __init__(self, skip_forward_function, cancel_function):
+        self.skip_forward_function = skip_forward_function
+        self.cancel_function = cancel_function
+
+
+def unsynchronised(function):
+    return function
+
+
+class SliderSync:
+    """
+    Moves sliders to the values published in snapshots, e.g. after another
+    session changed them, without writing those values back.
+    """
+
+    def __init__(self):
+        self.sliders = []
+        self.refreshing = False
+
+    def add(self, slider, get_published_value):
+        self.sliders += [(slider, get_published_value)]
+        return slider
 
-    def __init__(self, environment: Environment, pause_play_control_functions: PausePlayControlFunctions):
+    def add_parameter(self, slider, parameters_name, *keys):
+        """
+        The slider shows snapshot.parameters[parameters_name][key], or the
+        pair of values for two keys.
+        """
+        def get_published_value(snapshot):
+            values = tuple(snapshot.parameters[parameters_name][key] for key in keys)
+            return values if len(values) > 1 else values[0]
+
+        return self.add(slider, get_published_value)
+
+    def wrap(self, synchronise):
+        """
+        synchronise, followed by ignoring calls made while refreshing.
+        """
+        def synchronise_unless_refreshing(function):
+            function = synchronise(function)
+
+            def function_unless_refreshing(*args, **kwargs):
+                if not self.refreshing:
+                    function(*args, **kwargs)
+
+            return function_unless_refreshing
+
+        return synchronise_unless_refreshing
+
+    def refresh(self, snapshot):
+        self.refreshing = True
+        try:
+            for slider, get_published_value in self.sliders:
+                value = get_published_value(snapshot)
+                current_value = tuple(slider.value) if isinstance(value, tuple) else slider.value
+                if current_value != value:
+                    slider.value = value
+        finally:
+            self.refreshing = False
+
+
+class ControlPanel(Component):
+    """
+    synchronise wraps every callback that changes the environment, so that
+    it cannot run while the simulation is mid-iteration, e.g. by queueing
+    it on the SimulationWorker. refresh shows the play state, speed and
+    parameters published in a snapshot, which other sessions may have
+    changed.
+    """
+
+    def __init__(self, environment: Environment, pause_play_control_functions: PausePlayControlFunctions,
+                 speed_control_functions: SpeedControlFunctions,
+                 skip_forward_control_functions: SkipForwardControlFunctions, synchronise=unsynchronised):
         super().__init__()
-        self.component = Tabs(tabs=[
-            Tab("Action Centre",
-                ActionCentre(environment, pause_play_control_functions)).get_component(),
-            Tab("Blob Controls",
-                BlobControls(environment)).get_component(),
-            Tab("Food Controls",
-                FoodControls(environment)).get_component()
-        ])
+        self.action_centre = ActionCentre(pause_play_control_functions, speed_control_functions,
+                                          skip_forward_control_functions)
+        blob_controls = BlobControls(environment, synchronise)
+        food_controls = FoodControls(environment, synchronise)
+        self.controls = [self.action_centre, blob_controls, food_controls]
+        tabs = [
+            Tab("Action Centre", self.action_centre).get_component(),
+            Tab("Blob Controls", blob_controls).get_component(),
+            Tab("Food Controls", food_controls).get_component()
+        ]
+        self.performance = None
+        if environment.profiler.enabled:
+            self.performance = PerformanceTable(environment.profiler)
+            tabs += [Tab("Performance", self.performance).get_component()]
+        self.component = Tabs(tabs=tabs)
+
+    def refresh(self, snapshot):
+        for controls in self.controls:
+            controls.refresh(snapshot)
+        if self.performance is not None:
+            self.performance.refresh()
 
 
 class ActionCentre(Component):
-    def __init__(self, environment: Environment, pause_play_control_functions: PausePlayControlFunctions):
+    def __init__(self, pause_play_control_functions: PausePlayControlFunctions,
+                 speed_control_functions: SpeedControlFunctions,
+                 skip_forward_control_functions: SkipForwardControlFunctions):
         super().__init__()
 
         def skip_forward(fast_forward_interval):
-            def return_function():
-                if pause_play_control_functions.is_playing_function():
-                    pause_play_control_functions.pause_function()
-                    environment.skip_forward(fast_forward_interval)
-                    pause_play_control_functions.play_function()
-                else:
-                    environment.skip_forward(fast_forward_interval)
-
-            return return_function
+            return lambda: skip_forward_control_functions.skip_forward_function(fast_forward_interval)
+
+        self.slider_sync = SliderSync()
+        self.pause_play_button = ActionCentre.make_pause_play_button(pause_play_control_functions)
+        self.skip_forward_progress = Div(text="")
+        self.cancel_button = ActionCentre.make_button(
+            label="Cancel skip",
+            button_type="danger",
+            callback=skip_forward_control_functions.cancel_function
+        )
+        self.cancel_button.disabled = True
 
         self.component = column(
             ActionCentre.make_button(
@@ -64,15 +158,45 @@ class ActionCentre(Component):
                 button_type="default",
                 callback=skip_forward(3000)
             ),
-            ActionCentre.make_pause_play_button(pause_play_control_functions)
+            self.cancel_button,
+            self.skip_forward_progress,
+            self.pause_play_button,
+            self.slider_sync.add(ActionCentre.make_steps_per_frame_slider(speed_control_functions, self.slider_sync),
+                                 lambda snapshot: snapshot.steps_per_frame)
         )
 
+    def refresh(self, snapshot):
+        ActionCentre.show_playing(self.pause_play_button, snapshot.playing)
+        self.slider_sync.refresh(snapshot)
+
+    def show_skip_forward_progress(self, job):
+        if job.finished:
+            outcome = "Cancelled" if job.cancelled else "Skipped"
+            self.skip_forward_progress.text = "{} {} steps".format(outcome, job.steps_done)
+        else:
+            self.skip_forward_progress.text = "Skipping: {}/{} steps, {:.0f} steps/sec, {} blobs".format(
+                job.steps_done, job.steps, job.get_steps_per_second(), job.population)
+        self.cancel_button.disabled = job.finished
+
     @staticmethod
     def make_button(label: "", button_type: "", callback):
         button = Button(label=label, button_type=button_type)
         button.on_click(lambda _event: callback())
         return button
 
+    @staticmethod
+    def make_steps_per_frame_slider(speed_control_functions: SpeedControlFunctions, slider_sync: SliderSync):
+        slider = Slider(
+            start=1,
+            end=500,
+            value=speed_control_functions.get_steps_per_frame_function(),
+            step=1,
+            title="Steps per frame"
+        )
+        set_steps_per_frame = slider_sync.wrap(unsynchronised)(speed_control_functions.set_steps_per_frame_function)
+        slider.on_change("value", lambda _attr, _old, new: set_steps_per_frame(new))
+        return slider
+
     @staticmethod
     def make_pause_play_button(pause_play_control_functions: PausePlayControlFunctions):
         button = Button(label="Pause", button_type="warning")
@@ -80,64 +204,116 @@ class ActionCentre(Component):
         def toggle_pause_play():
             if pause_play_control_functions.is_playing_function():
                 pause_play_control_functions.pause_function()
-                button.button_type = "success"
-                button.label = "Play"
+                ActionCentre.show_playing(button, False)
             else:
                 pause_play_control_functions.play_function()
-                button.button_type = "warning"
-                button.label = "Pause"
+                ActionCentre.show_playing(button, True)
 
         button.on_click(lambda _event: toggle_pause_play())
         return button
 
+    @staticmethod
+    def show_playing(button, playing):
+        button.button_type = "warning" if playing else "success"
+        button.label = "Pause" if playing else "Play"
+
+
+class PerformanceTable(Component):
+    """
+    Rolling per-phase tick timings and per-tick counts from a TickProfiler.
+    """
+    REFRESH_INTERVAL = 1.
+
+    def __init__(self, profiler: TickProfiler):
+        super().__init__()
+        self.profiler = profiler
+        self.last_refresh_time = 0.
+        self.component = Div(text="")
+
+    def refresh(self):
+        now = time.perf_counter()
+        if now - self.last_refresh_time < PerformanceTable.REFRESH_INTERVAL:
+            return
+        self.last_refresh_time = now
+        header = "<tr><th></th>" + "".join("<th>p{}</th>".format(p) for p in TickProfiler.PERCENTILES) + \
+                 "<th></th></tr>"
+        rows = "".join(
+            "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>".format(
+                name, *(TickProfiler.format_value(value, unit) for value in (p50, p90, p99)), unit)
+            for name, p50, p90, p99, unit in self.profiler.summary_rows()
+        )
+        self.component.text = "<table>{}{}</table>".format(header, rows)
+
 
 class BlobControls(Component):
-    def __init__(self, environment: Environment):
+    def __init__(self, environment: Environment, synchronise=unsynchronised):
         super().__init__()
         self.environment = environment
+        self.slider_sync = SliderSync()
+        synchronise_slider = self.slider_sync.wrap(synchronise)
 
         self.component = column(
-            BlobControls.make_extrema_slider(
-                absolute_min=0,
-                absolute_max=0.5,
-                extrema_values=Blob.SPEED_EXTREMA,
-                step=.0001,
-                label="Blob speed",
-                environment_callback=environment.organisms.update_extrema_of_organisms
+            self.slider_sync.add_parameter(
+                BlobControls.make_extrema_slider(
+                    absolute_min=0,
+                    absolute_max=0.5,
+                    extrema_values=environment.parameters.blob_speed_extrema,
+                    step=.0001,
+                    label="Blob speed",
+                    environment_callback=environment.organisms.update_extrema_of_organisms,
+                    synchronise=synchronise_slider
+                ),
+                "blob_speed_extrema", "minimum", "maximum"
             ),
-            BlobControls.make_extrema_slider(
-                absolute_min=0,
-                absolute_max=0.5,
-                extrema_values=Blob.RADIUS_EXTREMA,
-                step=.0001,
-                label="Blob radius",
-                environment_callback=environment.organisms.update_extrema_of_organisms
+            self.slider_sync.add_parameter(
+                BlobControls.make_extrema_slider(
+                    absolute_min=0,
+                    absolute_max=0.5,
+                    extrema_values=environment.parameters.blob_radius_extrema,
+                    step=.0001,
+                    label="Blob radius",
+                    environment_callback=environment.organisms.update_extrema_of_organisms,
+                    synchronise=synchronise_slider
+                ),
+                "blob_radius_extrema", "minimum", "maximum"
             ),
-            BlobControls.make_parameter_slider(
-                parameters=Blob.MUTATION_PARAMETERS,
-                key="speed",
-                min_value=0,
-                max_value=0.5,
-                step=0.005,
-                label="Speed mutation"
+            self.slider_sync.add_parameter(
+                BlobControls.make_parameter_slider(
+                    parameters=environment.parameters.blob_mutation_parameters,
+                    key="speed",
+                    min_value=0,
+                    max_value=0.5,
+                    step=0.005,
+                    label="Speed mutation",
+                    synchronise=synchronise_slider
+                ),
+                "blob_mutation_parameters", "speed"
             ),
-            BlobControls.make_parameter_slider(
-                parameters=Blob.MUTATION_PARAMETERS,
-                key="radius",
-                min_value=0,
-                max_value=0.5,
-                step=0.005,
-                label="Radius mutation"
+            self.slider_sync.add_parameter(
+                BlobControls.make_parameter_slider(
+                    parameters=environment.parameters.blob_mutation_parameters,
+                    key="radius",
+                    min_value=0,
+                    max_value=0.5,
+                    step=0.005,
+                    label="Radius mutation",
+                    synchronise=synchronise_slider
+                ),
+                "blob_mutation_parameters", "radius"
             ),
             BlobControls.make_button(
                 label="Add blobs",
                 button_type="primary",
-                callback=environment.add_some_organisms
+                callback=synchronise(environment.add_some_organisms)
             )
         )
 
+    def refresh(self, snapshot):
+        self.slider_sync.refresh(snapshot)
+
     @staticmethod
-    def make_extrema_slider(absolute_min, absolute_max, extrema_values, step, label, environment_callback):
+    def make_extrema_slider(absolute_min, absolute_max, extrema_values, step, label, environment_callback,
+                            synchronise=unsynchronised):
         slider = RangeSlider(
             start=absolute_min,
             end=absolute_max,
@@ -151,12 +327,13 @@ class BlobControls(Component):
             extrema_values["maximum"] = new_max
             environment_callback()
 
+        update_extrema_callback = synchronise(update_extrema_callback)
         slider.on_change("value",
                          lambda _attr, _old, new_value: update_extrema_callback(new_value[0], new_value[1]))
         return slider
 
     @staticmethod
-    def make_parameter_slider(parameters, key, min_value, max_value, step, label):
+    def make_parameter_slider(parameters, key, min_value, max_value, step, label, synchronise=unsynchronised):
         slider = Slider(
             start=min_value,
             end=max_value,
@@ -168,6 +345,7 @@ class BlobControls(Component):
         def change_parameter_callback(new_value):
             parameters[key] = new_value
 
+        change_parameter_callback = synchronise(change_parameter_callback)
         slider.on_change("value", lambda _attr, _old, new: change_parameter_callback(new))
         return slider
 
@@ -179,52 +357,98 @@ class BlobControls(Component):
 
 
 class FoodControls(Component):
-    def __init__(self, environment: Environment):
+    def __init__(self, environment: Environment, synchronise=unsynchronised):
         super().__init__()
         self.environment = environment
+        self.slider_sync = SliderSync()
+        synchronise_slider = self.slider_sync.wrap(synchronise)
 
         self.component = column(
-            FoodControls.make_extrema_slider(
-                absolute_min=0.001,
-                absolute_max=0.1,
-                extrema_values=Foodage.RADIUS_EXTREMA,
-                step=.001,
-                label="Food Size",
-                environment_callback=environment.foodage.update_food_gen_parameters
+            self.slider_sync.add_parameter(
+                FoodControls.make_extrema_slider(
+                    absolute_min=0.001,
+                    absolute_max=0.1,
+                    extrema_values=environment.parameters.food_radius_extrema,
+                    step=.001,
+                    label="Food Size",
+                    environment_callback=environment.foodage.update_food_gen_parameters,
+                    synchronise=synchronise_slider
+                ),
+                "food_radius_extrema", "minimum", "maximum"
+            ),
+            self.slider_sync.add_parameter(
+                FoodControls.make_parameter_slider(
+                    parameters=environment.parameters.food_parameters,
+                    key="energy_per_radius",
+                    min_value=0,
+                    max_value=100,
+                    step=1,
+                    label="Calorie Density",
+                    synchronise=synchronise_slider
+                ),
+                "food_parameters", "energy_per_radius"
             ),
-            FoodControls.make_parameter_slider(
-                parameters=Foodage.FOOD_PARAMETERS,
-                key="energy_per_radius",
-                min_value=0,
-                max_value=100,
-                step=1,
-                label="Calorie Density"
+            self.slider_sync.add_parameter(
+                FoodControls.make_parameter_slider(
+                    parameters=environment.parameters.environment_food_parameters,
+                    key="time",
+                    min_value=10,
+                    max_value=1000,
+                    step=10,
+                    label="Time Steps per Feed",
+                    synchronise=synchronise_slider
+                ),
+                "environment_food_parameters", "time"
             ),
-            FoodControls.make_parameter_slider(
-                parameters=environment.FOOD_PARAMETERS,
-                key="time",
-                min_value=10,
-                max_value=1000,
-                step=10,
-                label="Time Steps per Feed"
+            self.slider_sync.add_parameter(
+                FoodControls.make_parameter_slider(
+                    parameters=environment.parameters.environment_food_parameters,
+                    key="number_of_new_foods",
+                    min_value=1,
+                    max_value=100,
+                    step=1,
+                    label="Number of Foods per Feed",
+                    synchronise=synchronise_slider
+                ),
+                "environment_food_parameters", "number_of_new_foods"
             ),
-            FoodControls.make_parameter_slider(
-                parameters=environment.FOOD_PARAMETERS,
-                key="number_of_new_foods",
-                min_value=1,
-                max_value=100,
-                step=1,
-                label="Number of Foods per Feed"
+            self.slider_sync.add_parameter(
+                FoodControls.make_parameter_slider(
+                    parameters=environment.parameters.food_regrowth_parameters,
+                    key="rate",
+                    min_value=0,
+                    max_value=10,
+                    step=0.1,
+                    label="Regrowth per Time Step",
+                    synchronise=synchronise_slider
+                ),
+                "food_regrowth_parameters", "rate"
+            ),
+            self.slider_sync.add_parameter(
+                FoodControls.make_parameter_slider(
+                    parameters=environment.parameters.food_regrowth_parameters,
+                    key="patches",
+                    min_value=0,
+                    max_value=10,
+                    step=1,
+                    label="Regrowth Patches",
+                    synchronise=synchronise_slider
+                ),
+                "food_regrowth_parameters", "patches"
             ),
             FoodControls.make_button(
                 label="Add food",
                 button_type="primary",
-                callback=environment.add_some_food
+                callback=synchronise(environment.add_some_food)
             )
         )
 
+    def refresh(self, snapshot):
+        self.slider_sync.refresh(snapshot)
+
     @staticmethod
-    def make_extrema_slider(absolute_min, absolute_max, extrema_values, step, label, environment_callback):
+    def make_extrema_slider(absolute_min, absolute_max, extrema_values, step, label, environment_callback,
+                            synchronise=unsynchronised):
         slider = RangeSlider(
             start=absolute_min,
             end=absolute_max,
@@ -238,12 +462,13 @@ class FoodControls(Component):
             extrema_values["maximum"] = new_max
             environment_callback()
 
+        update_extrema_callback = synchronise(update_extrema_callback)
         slider.on_change("value",
                          lambda _attr, _old, new_value: update_extrema_callback(new_value[0], new_value[1]))
         return slider
 
     @staticmethod
-    def make_parameter_slider(parameters, key, min_value, max_value, step, label):
+    def make_parameter_slider(parameters, key, min_value, max_value, step, label, synchronise=unsynchronised):
         slider = Slider(
             start=min_value,
             end=max_value,
@@ -255,6 +480,7 @@ class FoodControls(Component):
         def change_parameter_callback(new_value):
             parameters[key] = new_value
 
+        change_parameter_callback = synchronise(change_parameter_callback)
         slider.on_change("value", lambda _attr, _old, new: change_parameter_callback(new))
         return slider
 
@@ -1,52 +1,382 @@
+import json
+import os
+import tempfile
+from copy import deepcopy
+from blob import Blob
 from organisms import Organisms
 from foodage import Foodage
+from consumption import candidate_pairs, find_eaters, NO_EATER
+from helpers import minimum_image
+from kernels import get_kernels
+from profiler import NullProfiler, TickProfiler
+from random_streams import RandomStreams
 import numpy as np
 
 
+class SimulationParameters:
+    """
+    The tunable parameter dicts of a single Environment. Each starts as a
+    copy of the class-level defaults, so environments never share settings.
+    """
+
+    def __init__(self, overrides: dict = None):
+        self.blob_speed_extrema = deepcopy(Blob.SPEED_EXTREMA)
+        self.blob_radius_extrema = deepcopy(Blob.RADIUS_EXTREMA)
+        self.blob_mutation_parameters = deepcopy(Blob.MUTATION_PARAMETERS)
+        self.environment_food_parameters = deepcopy(Environment.FOOD_PARAMETERS)
+        self.food_radius_extrema = deepcopy(Foodage.RADIUS_EXTREMA)
+        self.food_parameters = deepcopy(Foodage.FOOD_PARAMETERS)
+        self.food_regrowth_parameters = deepcopy(Environment.FOOD_REGROWTH_PARAMETERS)
+        if overrides is not None:
+            self.apply_overrides(overrides)
+
+    def apply_overrides(self, overrides: dict):
+        """
+        Overrides are keyed by dotted names such as 'blob_mutation_parameters.speed'.
+        """
+        for name, value in overrides.items():
+            parameters_name, _, key = name.partition('.')
+            parameters = getattr(self, parameters_name, None)
+            if not isinstance(parameters, dict) or key not in parameters:
+                raise KeyError("Unknown simulation parameter '" + name + "'")
+            parameters[key] = value
+
+    def to_dict(self):
+        return deepcopy(vars(self))
+
+
 class Environment:
     FOOD_PARAMETERS = {
         'time' : 50,
         'number_of_new_foods': 10
     }
-    def __init__(self, number_of_blobs=0, starting_food_items=0):
+    # Continuous regrowth on top of the bulk drops: on average 'rate' food
+    # items per step, spread over a cells x cells map that is uniform or
+    # made of Gaussian patches, each cell slowing as it nears its carrying
+    # capacity (0 for none)
+    FOOD_REGROWTH_PARAMETERS = {
+        'rate': 0,
+        'cells': 16,
+        'patches': 0,
+        'patch_radius': 0.1,
+        'patch_seed': 0,
+        'carrying_capacity': 0
+    }
+    def __init__(self, number_of_blobs=0, starting_food_items=0, spatial_index="grid",
+                 parameters: SimulationParameters = None, seed=None, kernels="numpy"):
+        """
+        kernels picks the implementation of the inner loops, "numpy" or
+        "numba" (see kernels.get_kernels); both give the same simulation.
+        """
         self.current_time = 0
+        self.parameters = SimulationParameters() if parameters is None else parameters
+        self.random_streams = RandomStreams(seed)
+        self.kernels = get_kernels(kernels)
 
-        self.organisms = Organisms()
+        self.organisms = Organisms(self.parameters, self.random_streams, spatial_index, self.kernels)
         self.organisms.add_random_blobs(number_of_blobs)
 
-        self.foodage = Foodage()
+        self.foodage = Foodage(self.parameters, self.random_streams, self.kernels)
         self.foodage.add_random_foods(starting_food_items)
 
         self.get_data_callbacks = []
+        self.profiler = NullProfiler()
+        self.parallel_engine = None
+        self.fusion_backoff = 0
+        self.next_fusion_time = 0
 
-    def process_food_consumption(self):
-        food_list = self.foodage.food_list.copy()
-        for food in food_list:
-            for organism in self.organisms.find_close_organisms(food.bounding_box):
-                if organism.radius > food.radius and \
-                        np.linalg.norm(food.position - organism.position) < organism.radius + food.radius:
-                    organism.eat_food(food)
-                    self.foodage.delete_food(food)
-                    break
+    def enable_profiling(self, window=1000):
+        self.profiler = TickProfiler(window)
+        return self.profiler
 
-    def iterate(self):
+    def disable_profiling(self):
+        self.profiler = NullProfiler()
+
+    def enable_parallel(self, number_of_workers=None, tiles_per_side=None):
+        """
+        Iterates on a pool of number_of_workers processes, by default one per
+        core, until disable_parallel is called. Seeded runs are unchanged.
+        Needs multiprocessing.shared_memory, so Python 3.8 or later.
+        """
+        from parallel import ParallelEngine
+        self.disable_parallel()
+        if tiles_per_side is None:
+            tiles_per_side = ParallelEngine.TILES_PER_SIDE
+        self.parallel_engine = ParallelEngine(number_of_workers, tiles_per_side, self.kernels)
+        return self.parallel_engine
+
+    def disable_parallel(self):
+        if self.parallel_engine is not None:
+            self.parallel_engine.close()
+            self.parallel_engine = None
+
+    def process_food_consumption(self, candidates=None):
+        """
+        Organisms eat the food they overlap. candidates, if given, are the
+        sorted rows of the only organisms that could be overlapping any.
+        Returns the number of food items eaten.
+        """
+        if len(self.foodage) == 0:
+            return 0
+        population = self.organisms.population
+        if candidates is not None:
+            # Candidates are in row order, so the lowest local index is also the lowest row
+            eaters = find_eaters(self.foodage.get_positions(), self.foodage.get_radii(),
+                                 population.position[candidates], population.radius[candidates],
+                                 periodic=True, profiler=self.profiler, kernels=self.kernels)
+            found = eaters != NO_EATER
+            eaters[found] = candidates[eaters[found]]
+        elif self.parallel_engine is not None:
+            eaters = self.parallel_engine.find_eaters(self.foodage.position, self.foodage.radius,
+                                                      population.position, population.radius)
+        else:
+            # The food index only pays off, and is only rebuilt, when the organisms are fewer
+            food_index = self.foodage.get_spatial_index() if len(population) < len(self.foodage) else None
+            eaters = find_eaters(self.foodage.get_positions(), self.foodage.get_radii(),
+                                 population.position, population.radius, self.organisms.spatial_index,
+                                 periodic=True, profiler=self.profiler, food_index=food_index,
+                                 kernels=self.kernels)
+        eaten = (eaters != NO_EATER) & ~self.foodage.eaten
+        number_eaten = int(np.count_nonzero(eaten))
+        if number_eaten:
+            self.profiler.count('food_eaten', number_eaten)
+            np.add.at(population.energy, eaters[eaten], self.foodage.energy[eaten])
+            self.foodage.eaten |= eaten
+        self.foodage.remove_eaten()
+        return number_eaten
+
+    def iterate(self, run_data_callbacks=True):
+        profiler = self.profiler
+        profiler.start_tick()
         self.current_time += 1
-        self.organisms.update(self.current_time)
-        self.process_food_consumption()
-        for callback in self.get_data_callbacks:
-            callback()
-        if self.current_time % Environment.FOOD_PARAMETERS['time'] == 0:
-            self.add_some_food(Environment.FOOD_PARAMETERS['number_of_new_foods'])
+        self.organisms.update(self.current_time, profiler, self.parallel_engine)
+        with profiler.phase('food_consumption'):
+            self.process_food_consumption()
+        self.end_step(run_data_callbacks)
+        profiler.end_tick()
+
+    def end_step(self, run_data_callbacks=True):
+        profiler = self.profiler
+        with profiler.phase('data_callbacks'):
+            if run_data_callbacks:
+                for callback in self.get_data_callbacks:
+                    callback()
+        with profiler.phase('food_spawning'):
+            if self.current_time % self.parameters.environment_food_parameters['time'] == 0:
+                self.add_some_food(self.parameters.environment_food_parameters['number_of_new_foods'])
+            self.foodage.regrow()
+
+    # Longest run of steps advance fuses, how far ahead of each organism it
+    # looks for food, and the distance it keeps from food for rounding
+    MAX_FUSED_STEPS = 64
+    FUSION_LOOKAHEAD = 0.05
+    FUSION_MARGIN = 1e-9
+    # Fused runs cut shorter than this by eating or dying cost more than
+    # they save, so advance backs off from fusing for a while after one
+    MIN_FUSED_STEPS = 4
+
+    def advance(self, number_of_steps, sampling_interval=1):
+        """
+        Runs number_of_steps steps, ending in the same state as calling
+        iterate that many times, except that data callbacks are only called
+        on steps that are a multiple of sampling_interval. Runs of steps
+        until someone eats or dies are fused (see run_fused_steps).
+        """
+        end_time = self.current_time + number_of_steps
+        while self.current_time < end_time:
+            steps = 0
+            if self.current_time >= self.next_fusion_time:
+                steps = self.get_fusable_steps(end_time - self.current_time, sampling_interval)
+            if steps <= 1:
+                self.iterate(run_data_callbacks=(self.current_time + 1) % sampling_interval == 0)
+                continue
+            steps_run = self.run_fused_steps(steps, sampling_interval)
+            if steps_run < min(steps, Environment.MIN_FUSED_STEPS):
+                self.fusion_backoff = min(2 * self.fusion_backoff + 1, Environment.MAX_FUSED_STEPS)
+                self.next_fusion_time = self.current_time + self.fusion_backoff
+            else:
+                self.fusion_backoff = 0
+
+    def get_fusable_steps(self, max_steps, sampling_interval=1):
+        """
+        How many of the next steps, up to max_steps, can be fused. None can
+        with the parallel engine or food regrowth, or while an organism is
+        dead or can afford offspring. Otherwise a run ends on the next
+        sampling step or food drop, so that these are handled as in iterate.
+        """
+        population = self.organisms.population
+        if self.parallel_engine is not None or self.parameters.food_regrowth_parameters['rate'] > 0 or \
+                population.is_dead().any() or len(population.select_parents(np.arange(population.size))):
+            return 0
+        food_time = self.parameters.environment_food_parameters['time']
+        return min(max_steps, Environment.MAX_FUSED_STEPS, sampling_interval - self.current_time % sampling_interval,
+                   food_time - self.current_time % food_time)
+
+    def get_steps_before_reaching_food(self, max_steps):
+        """
+        For each organism, a number of steps, up to max_steps, in which it
+        cannot come within reach of food smaller than it, moving speed ** 2
+        a step. Only food within FUSION_LOOKAHEAD is looked at, so organisms
+        that could go further in max_steps get fewer steps.
+        """
+        population, foodage = self.organisms.population, self.foodage
+        step_lengths = population.speed ** 2
+        lookahead = np.minimum(max_steps * step_lengths, Environment.FUSION_LOOKAHEAD)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            steps = np.where(lookahead < Environment.FUSION_LOOKAHEAD, max_steps,
+                             np.floor(Environment.FUSION_LOOKAHEAD / step_lengths))
+        food_indices, organism_indices = candidate_pairs(foodage.get_positions(), foodage.get_radii(),
+                                                         population.position, population.radius + lookahead,
+                                                         periodic=True)
+        eligible = population.radius[organism_indices] > foodage.radius[food_indices]
+        organism_indices, food_indices = organism_indices[eligible], food_indices[eligible]
+        separation = minimum_image(population.position[organism_indices] - foodage.position[food_indices])
+        gaps = np.sqrt(np.einsum("ij,ij->i", separation, separation)) - population.radius[organism_indices] - \
+            foodage.radius[food_indices] - Environment.FUSION_MARGIN
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.minimum.at(steps, organism_indices,
+                          np.nan_to_num(np.floor(gaps / step_lengths[organism_indices]), nan=0.))
+        return np.maximum(steps, 0)
+
+    def run_fused_steps(self, number_of_steps, sampling_interval=1):
+        """
+        Up to number_of_steps steps found by get_fusable_steps, recorded by
+        the profiler as that many steps. Organisms are only checked for food or starvation
+        from the first step on which they could reach food or starve, and
+        the steps before anyone could are moved in one batch. The run ends
+        early on the first step on which someone eats or dies, as births
+        may follow, with the rest of that step done as in iterate. Returns
+        the number of steps run.
+        """
+        profiler = self.profiler
+        profiler.start_tick()
+        population = self.organisms.population
+        with profiler.phase('food_consumption'):
+            safe_steps = np.minimum(self.get_steps_before_reaching_food(number_of_steps),
+                                    population.get_steps_before_starving())
+        start_time = self.current_time
+        end_time = start_time + number_of_steps
+        while self.current_time < end_time:
+            steps_run = self.current_time - start_time
+            candidates = np.flatnonzero(safe_steps <= steps_run)
+            steps = 1 if len(candidates) else int(safe_steps.min(initial=number_of_steps)) - steps_run
+            with profiler.phase('movement_and_metabolism'):
+                population.move_steps(steps)
+            self.current_time += steps
+            if len(candidates) == 0:
+                continue
+            population.mark_starved(self.current_time)
+            with profiler.phase('deaths'):
+                number_of_deaths = population.remove_dead()
+            profiler.count('deaths', number_of_deaths)
+            if number_of_deaths:
+                # Rows have moved, so the step finishes as in iterate
+                with profiler.phase('spatial_index'):
+                    self.organisms.rebuild_spatial_index()
+                with profiler.phase('food_consumption'):
+                    self.process_food_consumption()
+                break
+            with profiler.phase('food_consumption'):
+                if self.process_food_consumption(candidates):
+                    break
+        steps_run = self.current_time - start_time
+        profiler.count('fused_steps', steps_run)
+        profiler.count('blobs_updated', steps_run * len(population))
+        with profiler.phase('spatial_index'):
+            self.organisms.rebuild_spatial_index()
+        self.end_step(self.current_time % sampling_interval == 0)
+        profiler.end_tick(steps_run)
+        return steps_run
+
+    CHECKPOINT_FORMAT_VERSION = 1
+
+    def get_state(self):
+        """
+        The full simulation state as a flat dict of arrays, which is what
+        checkpoints store.
+        """
+        state = {
+            'format_version': np.array(Environment.CHECKPOINT_FORMAT_VERSION),
+            'current_time': np.array(self.current_time),
+            'spatial_index': np.array(self.organisms.spatial_index_name),
+            'parameters': np.array(json.dumps(self.parameters.to_dict())),
+            'random_streams': np.array(json.dumps(self.random_streams.get_state()))
+        }
+        for name, values in self.organisms.population.get_state().items():
+            state['population.' + name] = values
+        for name, values in self.foodage.get_state().items():
+            state['foodage.' + name] = values
+        return state
+
+    def set_state(self, state: dict):
+        if int(state['format_version']) != Environment.CHECKPOINT_FORMAT_VERSION:
+            raise ValueError("Unsupported checkpoint format version " + str(state['format_version']))
+        self.current_time = int(state['current_time'])
+        for name, values in json.loads(str(state['parameters'])).items():
+            getattr(self.parameters, name).update(values)
+        self.random_streams.set_state(json.loads(str(state['random_streams'])))
+        self.organisms.population.set_state(
+            {name[len('population.'):]: values for name, values in state.items() if name.startswith('population.')})
+        self.organisms.rebuild_spatial_index()
+        self.foodage.set_state(
+            {name[len('foodage.'):]: values for name, values in state.items() if name.startswith('foodage.')})
+        self.fusion_backoff = 0
+        self.next_fusion_time = 0
+
+    def save(self, path):
+        """
+        Writes a compressed .npz checkpoint. The file is replaced atomically
+        so that a crash while saving never leaves a truncated checkpoint.
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        # Each save gets its own temporary file so that concurrent saves to the same path cannot collide
+        with tempfile.NamedTemporaryFile(dir=directory, prefix=name + '.', suffix='.partial', delete=False) as checkpoint_file:
+            temporary_path = checkpoint_file.name
+            try:
+                np.savez_compressed(checkpoint_file, **self.get_state())
+            except BaseException:
+                checkpoint_file.close()
+                os.remove(temporary_path)
+                raise
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def load(path, kernels="numpy"):
+        with np.load(path, allow_pickle=False) as checkpoint:
+            state = dict(checkpoint)
+        environment = Environment(spatial_index=str(state['spatial_index']), kernels=kernels)
+        environment.set_state(state)
+        return environment
 
     def add_data_callback(self, callback):
         self.get_data_callbacks += [callback]
 
     def skip_forward(self, iterations=100):
-        for i in range(iterations):
-            self.iterate()
+        self.advance(iterations)
 
     def add_some_food(self, food_to_add=5):
         self.foodage.add_random_foods(food_to_add)
 
     def add_some_organisms(self, organisms_to_add=5):
         self.organisms.add_random_blobs(number_of_new_blobs=organisms_to_add, current_time=self.current_time)
+
+
+class EnvironmentSnapshot:
+    """
+    Copy of the state the views draw, taken between iterations so that it
+    can be rendered while the simulation carries on. playing and
+    steps_per_frame are those of the worker iterating the environment, so
+    that every session's controls can show them.
+    """
+
+    def __init__(self, environment: Environment, playing=False, steps_per_frame=1):
+        self.current_time = environment.current_time
+        self.parameters = environment.parameters.to_dict()
+        self.playing = playing
+        self.steps_per_frame = steps_per_frame
+        self.population = environment.organisms.population.copy()
+        self.population.remove_dead()
+        foodage = environment.foodage
+        self.food_ids = foodage.id[~foodage.eaten]
+        self.food_positions = foodage.position[~foodage.eaten]
+        self.food_radii = foodage.radius[~foodage.eaten]
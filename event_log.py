@@ -0,0 +1,138 @@
+import glob
+import os
+import queue
+import threading
+import numpy as np
+from environment import Environment
+from population import Population
+from runner import check_output_path, write_series
+
+
+class EventLog:
+    """
+    Opt-in append-only record of every birth and death. Events are buffered
+    as arrays and every chunk_size events of a kind are handed to a
+    background thread, which writes them as one columnar chunk file, so the
+    simulation never waits on the disk. Chunks are named like
+    births-000000.npz and numbered on from any already in the directory.
+
+    Births hold id, parent_id (NO_PARENT for organisms not born of
+    another), time, speed, radius and starting_energy; deaths hold id, time
+    and cause, one of Population.CAUSES_OF_DEATH.
+    """
+    KINDS = ("births", "deaths")
+    EXTENSIONS = (".npz", ".parquet")
+    CHUNK_SIZE = 100000
+
+    def __init__(self, environment: Environment, directory, chunk_size=CHUNK_SIZE, extension=".npz",
+                 record_existing=True):
+        if extension not in EventLog.EXTENSIONS:
+            raise ValueError("Unsupported chunk format '" + extension + "', expected one of " +
+                             ", ".join(EventLog.EXTENSIONS))
+        check_output_path("chunk" + extension)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.extension = extension
+        self.buffers = {kind: [] for kind in EventLog.KINDS}
+        self.buffered = {kind: 0 for kind in EventLog.KINDS}
+        self.next_chunk = {kind: len(get_chunk_paths(directory, kind)) for kind in EventLog.KINDS}
+        self.closed = False
+
+        self.chunks = queue.Queue()
+        self.writer = threading.Thread(target=self.write_chunks, daemon=True)
+        self.writer.start()
+
+        population = environment.organisms.population
+        if record_existing and len(population) > 0:
+            self.record_births(population, slice(0, len(population)))
+        population.add_birth_callback(self.record_births)
+        population.add_death_callback(self.record_deaths)
+
+    def record_births(self, population: Population, rows):
+        self.record("births", {
+            'id': population.id[rows],
+            'parent_id': population.parent_id[rows],
+            'time': population.time_of_birth[rows],
+            'speed': population.speed[rows],
+            'radius': population.radius[rows],
+            'starting_energy': population.starting_energy[rows]
+        })
+
+    def record_deaths(self, population: Population, rows):
+        self.record("deaths", {
+            'id': population.id[rows],
+            'time': population.time_of_death[rows],
+            'cause': population.cause_of_death[rows]
+        })
+
+    def record(self, kind, columns: dict):
+        if self.closed:
+            return
+        # Copied, because rows given as a slice are views of columns that keep changing
+        self.buffers[kind] += [{name: np.array(values) for name, values in columns.items()}]
+        self.buffered[kind] += len(columns['id'])
+        if self.buffered[kind] >= self.chunk_size:
+            self.hand_over(kind)
+
+    def hand_over(self, kind):
+        if self.buffered[kind] == 0:
+            return
+        batches = self.buffers[kind]
+        columns = {name: np.concatenate([batch[name] for batch in batches]) for name in batches[0]}
+        path = os.path.join(self.directory, "{}-{:06d}{}".format(kind, self.next_chunk[kind], self.extension))
+        self.next_chunk[kind] += 1
+        self.buffers[kind] = []
+        self.buffered[kind] = 0
+        self.chunks.put((columns, path))
+
+    def write_chunks(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            columns, path = chunk
+            if 'cause' in columns:
+                columns['cause'] = np.array(Population.CAUSES_OF_DEATH)[columns['cause']]
+            write_series(columns, path)
+
+    def flush(self):
+        """
+        Hands over the partly filled chunks too.
+        """
+        for kind in EventLog.KINDS:
+            self.hand_over(kind)
+
+    def close(self):
+        """
+        Writes everything still buffered and waits for the writer to finish.
+        """
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self.chunks.put(None)
+        self.writer.join()
+
+
+def get_chunk_paths(directory, kind):
+    return sorted(path for extension in EventLog.EXTENSIONS
+                  for path in glob.glob(os.path.join(directory, kind + "-*" + extension)))
+
+
+def read_events(directory, kind):
+    """
+    All chunks of one kind of event, as {column: array}.
+    """
+    chunks = []
+    for path in get_chunk_paths(directory, kind):
+        if path.endswith(".parquet"):
+            import pyarrow.parquet
+            table = pyarrow.parquet.read_table(path)
+            chunks += [{name: table.column(name).to_numpy() for name in table.column_names}]
+        else:
+            with np.load(path, allow_pickle=False) as chunk:
+                chunks += [dict(chunk)]
+    if not chunks:
+        return {}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
@@ -0,0 +1,133 @@
+"""
+Command line entry point for running the simulator without a browser, e.g.
+
+    python -m evolution run --blobs 8 --food 30 --steps 1e6 --seed 42 --out run.csv
+"""
+import argparse
+import json
+import sys
+from checkpoint import Checkpointer
+from environment import Environment
+from event_log import EventLog
+from kernels import KERNEL_NAMES
+from organisms import Organisms
+from runner import HeadlessRunner, check_output_path
+from sweep import ParameterSweep, expand_grid
+
+
+def number_of_steps(value):
+    return int(float(value))
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog="python -m evolution", description="Evolution simulator")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser("run", help="run a simulation headlessly")
+    run_parser.add_argument("--blobs", type=int, default=8, help="number of starting blobs")
+    run_parser.add_argument("--food", type=int, default=30, help="number of starting food items")
+    run_parser.add_argument("--steps", type=number_of_steps, default=10000,
+                            help="number of time steps to run, e.g. 1e6")
+    run_parser.add_argument("--seed", type=int, default=None, help="random seed")
+    run_parser.add_argument("--interval", type=int, default=100,
+                            help="time steps between recorded statistics")
+    run_parser.add_argument("--spatial-index", choices=list(Organisms.SPATIAL_INDICES), default="grid")
+    run_parser.add_argument("--kernels", choices=list(KERNEL_NAMES), default="numpy",
+                            help="implementation of the inner loops (numba requires numba)")
+    run_parser.add_argument("--out", default=None, help="output file (.csv, .npz or .parquet)")
+    run_parser.add_argument("--events", default=None,
+                            help="directory to log every birth and death to, in chunks")
+    run_parser.add_argument("--events-format", choices=["npz", "parquet"], default="npz",
+                            help="file format of the event log chunks (parquet requires pyarrow)")
+    run_parser.add_argument("--profile", action="store_true",
+                            help="print per-phase timings and counts for the last 1000 ticks on exit")
+    run_parser.add_argument("--parallel", type=int, default=None, metavar="WORKERS",
+                            help="iterate on this many worker processes (0 for one per core); same results")
+    run_parser.add_argument("--checkpoint", default=None, help="checkpoint file (.npz) saved during the run")
+    run_parser.add_argument("--checkpoint-every", type=number_of_steps, default=10000,
+                            help="time steps between checkpoints")
+    run_parser.add_argument("--resume", default=None,
+                            help="checkpoint to continue from; --blobs, --food, --seed and --spatial-index "
+                                 "are then ignored")
+    run_parser.set_defaults(function=run)
+
+    sweep_parser = subparsers.add_parser("sweep", help="run a parameter sweep in a process pool")
+    sweep_parser.add_argument("--grid", required=True,
+                              help="JSON file holding either a grid {name: [values]} or a list of "
+                                   "parameter sets, keyed by names such as blob_mutation_parameters.speed")
+    sweep_parser.add_argument("--out-dir", required=True, help="directory for results; reused to resume")
+    sweep_parser.add_argument("--replicates", type=int, default=1, help="seeds 0 to replicates - 1 per set")
+    sweep_parser.add_argument("--blobs", type=int, default=8, help="number of starting blobs")
+    sweep_parser.add_argument("--food", type=int, default=30, help="number of starting food items")
+    sweep_parser.add_argument("--steps", type=number_of_steps, default=10000, help="time steps per run")
+    sweep_parser.add_argument("--interval", type=int, default=100,
+                              help="time steps between recorded statistics")
+    sweep_parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    sweep_parser.set_defaults(function=sweep)
+    return parser
+
+
+def run(arguments):
+    if arguments.out is not None:
+        check_output_path(arguments.out)
+    if arguments.resume is not None:
+        environment = Environment.load(arguments.resume, kernels=arguments.kernels)
+    else:
+        environment = Environment(number_of_blobs=arguments.blobs, starting_food_items=arguments.food,
+                                  spatial_index=arguments.spatial_index, seed=arguments.seed,
+                                  kernels=arguments.kernels)
+    if arguments.profile:
+        environment.enable_profiling()
+    if arguments.parallel is not None:
+        environment.enable_parallel(arguments.parallel or None)
+    event_log = None
+    if arguments.events is not None:
+        event_log = EventLog(environment, arguments.events, extension="." + arguments.events_format,
+                             record_existing=arguments.resume is None)
+    checkpointer = None
+    if arguments.checkpoint is not None:
+        checkpointer = Checkpointer(arguments.checkpoint, arguments.checkpoint_every)
+    runner = HeadlessRunner(environment, snapshot_interval=arguments.interval, checkpointer=checkpointer)
+    try:
+        runner.run(arguments.steps)
+    except KeyboardInterrupt:
+        print("Interrupted at time " + str(environment.current_time), file=sys.stderr)
+    finally:
+        if arguments.out is not None:
+            runner.write(arguments.out)
+        if event_log is not None:
+            event_log.close()
+        environment.disable_parallel()
+        print("Ran {} steps in {:.1f}s ({:.1f} steps/sec), {} blobs and {} foods remaining".format(
+            runner.steps_run, runner.seconds_running, runner.get_steps_per_second(),
+            len(environment.organisms.population), len(environment.foodage)))
+        if arguments.profile:
+            print(environment.profiler.summary())
+        if arguments.seed is None and arguments.resume is None:
+            print("Rerun with --seed " + str(environment.random_streams.get_entropy()) + " to reproduce")
+
+
+def sweep(arguments):
+    with open(arguments.grid) as grid_file:
+        grid = json.load(grid_file)
+    parameter_sets = expand_grid(grid) if isinstance(grid, dict) else grid
+
+    parameter_sweep = ParameterSweep(parameter_sets, arguments.out_dir, seeds=range(arguments.replicates),
+                                     steps=arguments.steps, number_of_blobs=arguments.blobs,
+                                     starting_food_items=arguments.food, snapshot_interval=arguments.interval)
+    pending = len(parameter_sweep.pending_runs())
+    print("{} of {} runs left to do".format(pending, len(parameter_sweep.runs)))
+    for completed, summary in enumerate(parameter_sweep.run(arguments.workers), start=1):
+        print("[{}/{}] {} seed {} {}: {} blobs at the end ({:.1f} steps/sec)".format(
+            completed, pending, summary['run_id'], summary['seed'], json.dumps(summary['overrides']),
+            summary['final']['number_of_blobs'], summary['steps_per_second']))
+
+
+def main(argv=None):
+    arguments = make_parser().parse_args(argv)
+    arguments.function(arguments)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,39 @@
 from quad_tree import Rectangle
-import numpy as np
 
 
 class Food:
-    NUMBER_OF_FOODS = 0
+    """
+    View of a single food item stored in a Foodage, by its handle.
+    """
 
-    def __init__(self, position=None, energy=None, radius=None):
-        self.id = Food.NUMBER_OF_FOODS
-        Food.NUMBER_OF_FOODS += 1
+    def __init__(self, foodage, handle):
+        self.foodage = foodage
+        self.handle = handle
 
-        if position is None:
-            self.position = np.array(np.random.rand(2))
-        else:
-            self.position = position
+    @property
+    def index(self):
+        return self.foodage.get_row(self.handle)
 
-        if energy is None:
-            self.energy = 0.5
-        else:
-            self.energy = energy
+    @property
+    def id(self):
+        return int(self.foodage.id[self.index])
 
-        if radius is None:
-            self.radius = 0.01
-        else:
-            self.radius = radius
+    @property
+    def position(self):
+        return self.foodage.position[self.index]
 
-        self.bounding_box = Rectangle(x=self.position[0] - self.radius, y=self.position[1] - self.radius,
-                                      width=2 * self.radius, height=2 * self.radius)
+    @property
+    def energy(self):
+        return self.foodage.energy[self.index]
+
+    @property
+    def radius(self):
+        return self.foodage.radius[self.index]
+
+    @property
+    def bounding_box(self):
+        return Rectangle(x=self.position[0] - self.radius, y=self.position[1] - self.radius,
+                         width=2 * self.radius, height=2 * self.radius)
 
     def get_x_coordinate(self):
         return self.position[0]
@@ -33,5 +41,11 @@ class Food:
     def get_y_coordinate(self):
         return self.position[1]
 
+    def __eq__(self, other):
+        return isinstance(other, Food) and self.foodage is other.foodage and self.handle == other.handle
+
+    def __hash__(self):
+        return hash((id(self.foodage), self.handle))
+
     def __str__(self):
         return "<Food #" + str(self.id) + ">"
@@ -1,9 +1,59 @@
+import os
 from bokeh.plotting import curdoc
+from checkpoint import Checkpointer
 from environment import Environment
 from gui_components import App
+from simulation_server import SharedSimulation, get_shared_simulation
 
-environment = Environment(number_of_blobs=8, starting_food_items=30)
-app = App(environment)
+# Set EVOLUTION_CHECKPOINT to a .npz path to resume from it and keep it up to date while running
+CHECKPOINT_PATH = os.environ.get("EVOLUTION_CHECKPOINT")
+CHECKPOINT_INTERVAL = 1000
+# Set EVOLUTION_PROFILE to show per-phase tick timings in a Performance tab
+PROFILE = bool(os.environ.get("EVOLUTION_PROFILE"))
+# Set EVOLUTION_SHARED to have every session watch the same simulation, picked with ?simulation=<name>.
+# A checkpoint can only follow one run, so checkpointing always shares the simulation between sessions.
+SHARED = bool(os.environ.get("EVOLUTION_SHARED")) or CHECKPOINT_PATH is not None
+DEFAULT_SIMULATION_NAME = "default"
 
-curdoc().add_root(app.get_app())
-app.play()
+
+def get_checkpoint_path(name):
+    if CHECKPOINT_PATH is None or name == DEFAULT_SIMULATION_NAME:
+        return CHECKPOINT_PATH
+    root, extension = os.path.splitext(CHECKPOINT_PATH)
+    return root + "-" + name + extension
+
+
+def make_simulation(name=DEFAULT_SIMULATION_NAME):
+    checkpoint_path = get_checkpoint_path(name) if SHARED else None
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        environment = Environment.load(checkpoint_path)
+    else:
+        environment = Environment(number_of_blobs=8, starting_food_items=30)
+
+    if PROFILE:
+        environment.enable_profiling()
+
+    checkpointer = None
+    if checkpoint_path is not None:
+        checkpointer = Checkpointer(checkpoint_path, CHECKPOINT_INTERVAL)
+
+    simulation = SharedSimulation(environment, checkpointer)
+    simulation.worker.play()
+    return simulation
+
+
+def get_simulation_name(document):
+    names = document.session_context.request.arguments.get("simulation")
+    return names[0].decode() if names else DEFAULT_SIMULATION_NAME
+
+
+document = curdoc()
+if SHARED:
+    simulation = get_shared_simulation(get_simulation_name(document), make_simulation)
+    app = App(simulation)
+    document.on_session_destroyed(lambda _session_context: app.stop())
+else:
+    simulation = make_simulation()
+    app = App(simulation)
+    document.on_session_destroyed(lambda _session_context: (app.stop(), simulation.stop()))
+document.add_root(app.get_app())
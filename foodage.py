@@ -1,8 +1,18 @@
-from random import random
+import numpy as np
+from column_store import Column, ColumnStore
 from food import Food
+from grid_index import GridIndex
+from kernels import NumpyKernels
+from regrowth import RegrowthModel
 
 
-class Foodage:
+class Foodage(ColumnStore):
+    """
+    Columnar store of every food item, one row per item. Eaten food is only
+    marked, and removed in one pass by remove_eaten at the end of the tick.
+    The food is also held in its own grid index, rebuilt lazily the first
+    time it is queried after the food changed.
+    """
     RADIUS_EXTREMA = {
         "maximum": 0.1,
         "minimum": 0.0001
@@ -12,25 +22,112 @@ class Foodage:
         'energy_per_radius': 50,
     }
 
-    def __init__(self):
-        self.food_list = []
+    COLUMN_TYPES = {
+        "id": (np.int64, ()),
+        "position": (np.float64, (2,)),
+        "radius": (np.float64, ()),
+        "energy": (np.float64, ()),
+        "eaten": (np.bool_, ())
+    }
+
+    id = Column()
+    position = Column()
+    radius = Column()
+    energy = Column()
+    eaten = Column()
 
-    def update(self):
-        for food in self.food_list:
-            food.update()
+    def __init__(self, parameters, random_streams, kernels=NumpyKernels):
+        super().__init__()
+        self.parameters = parameters
+        self.random_streams = random_streams
+        self.number_of_foods_created = 0
+        self.spatial_index = GridIndex(periodic=True, kernels=kernels)
+        self.spatial_index_is_stale = True
+        self.regrowth_model = None
+        self.regrowth_parameters = None
 
-    def add_food(self, food):
-        self.food_list += [food]
+    @property
+    def food_list(self):
+        return [Food(self, handle) for handle in self.handle.tolist()]
+
+    def add_foods(self, positions, radii, energies):
+        new = self.append_rows(len(radii))
+        self.columns["id"][new] = np.arange(self.number_of_foods_created, self.number_of_foods_created + len(radii))
+        self.number_of_foods_created += len(radii)
+        self.columns["position"][new] = positions
+        self.columns["radius"][new] = radii
+        self.columns["energy"][new] = energies
+        self.columns["eaten"][new] = False
+        self.spatial_index_is_stale = True
+        return new
 
     def add_random_foods(self, number_of_new_foods=10):
-        for i in range(number_of_new_foods):
-            radius = Foodage.RADIUS_EXTREMA['minimum'] ** 2 + \
-                     random() * (Foodage.RADIUS_EXTREMA['maximum'] ** 2 - Foodage.RADIUS_EXTREMA['minimum'] ** 2)
-            self.add_food(
-                Food(energy=Foodage.FOOD_PARAMETERS['energy_per_radius'] ** 2 * radius * radius, radius=radius))
+        return self.add_foods_at(self.random_streams.food.random((number_of_new_foods, 2)))
+
+    def add_foods_at(self, positions):
+        """
+        Adds food at the given positions, with random radii and the energy
+        that goes with them.
+        """
+        random = self.random_streams.food
+        radius_extrema = self.parameters.food_radius_extrema
+        radii = radius_extrema['minimum'] ** 2 + \
+                random.random(len(positions)) * (radius_extrema['maximum'] ** 2 - radius_extrema['minimum'] ** 2)
+        return self.add_foods(positions, radii, self.parameters.food_parameters['energy_per_radius'] ** 2 * radii * radii)
+
+    def regrow(self):
+        """
+        One time step of the regrowth model set by the food_regrowth_parameters.
+        """
+        parameters = self.parameters.food_regrowth_parameters
+        if parameters['rate'] <= 0:
+            return
+        if parameters != self.regrowth_parameters:
+            self.regrowth_model = RegrowthModel.from_parameters(parameters)
+            self.regrowth_parameters = dict(parameters)
+        positions = self.regrowth_model.spawn_positions(self.position, self.random_streams.food)
+        if len(positions):
+            self.add_foods_at(positions)
+
+    def get_spatial_index(self):
+        if self.spatial_index_is_stale:
+            self.spatial_index.rebuild(self.position, self.radius)
+            self.spatial_index_is_stale = False
+        return self.spatial_index
 
     def delete_food(self, food):
-        self.food_list.remove(food)
+        self.eaten[self.get_row(food.handle)] = True
+
+    def remove_eaten(self):
+        if self.eaten.any():
+            self.keep(~self.eaten)
+            self.spatial_index_is_stale = True
+
+    def get_ids(self):
+        return self.id.copy()
+
+    def get_positions(self):
+        return self.position.copy()
+
+    def get_radii(self):
+        return self.radius.copy()
+
+    def get_energies(self):
+        return self.energy.copy()
+
+    def get_state(self):
+        state = super().get_state()
+        state['number_of_foods_created'] = np.array(self.number_of_foods_created)
+        return state
+
+    def set_state(self, state: dict):
+        state = dict(state)
+        state.setdefault('eaten', np.zeros(len(state['id']), dtype=bool))
+        super().set_state(state)
+        # Checkpoints from before food ids were counted per Foodage
+        self.number_of_foods_created = int(state.get('number_of_foods_created',
+                                                     self.id.max(initial=-1) + 1))
+        self.spatial_index_is_stale = True
 
     def update_food_gen_parameters(self):
         print('to be updated')
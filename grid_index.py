@@ -0,0 +1,125 @@
+import numpy as np
+from helpers import minimum_image
+from kernels import NumpyKernels
+from spatial_index import Rectangle, SpatialIndex, expand_ranges
+
+
+class GridIndex(SpatialIndex):
+    """
+    Uniform cell list over the unit square. Items are bucketed by the cell
+    holding their centre with a counting sort, and the cell size follows the
+    largest radius so that a query only has to look at a few cells. On a
+    periodic grid the cell blocks a query covers wrap around the edges.
+    """
+    MAX_CELLS_PER_SIDE = 64
+
+    def __init__(self, periodic=False, kernels=NumpyKernels):
+        self.periodic = periodic
+        self.kernels = kernels
+        self.positions = np.zeros((0, 2))
+        self.radii = np.zeros(0)
+        self.items = None
+        self.max_radius = 0.
+        self.cells_per_side = 1
+        self.cell_size = 1.
+        self.cell_starts = np.zeros(2, dtype=np.int64)
+        self.sorted_indices = np.zeros(0, dtype=np.int64)
+        self.needs_sorting = False
+
+    def rebuild(self, positions, radii, items=None):
+        self.positions = np.array(positions, dtype=float).reshape(-1, 2)
+        self.radii = np.array(radii, dtype=float)
+        self.items = None if items is None else list(items)
+        self.sort_into_cells()
+
+    def insert(self, new_object, bounding_box: Rectangle = None):
+        if bounding_box is None:
+            bounding_box = new_object.bounding_box
+        if self.items is None:
+            self.items = list(range(len(self.radii)))
+        centre = [bounding_box.x + bounding_box.width / 2, bounding_box.y + bounding_box.height / 2]
+        self.positions = np.vstack((self.positions, centre))
+        self.radii = np.append(self.radii, max(bounding_box.width, bounding_box.height) / 2)
+        self.items += [new_object]
+        self.needs_sorting = True
+
+    def remove(self, object_to_remove):
+        if self.items is None:
+            self.items = list(range(len(self.radii)))
+        kept = [item != object_to_remove for item in self.items]
+        self.positions = self.positions[kept]
+        self.radii = self.radii[kept]
+        self.items = [item for item, is_kept in zip(self.items, kept) if is_kept]
+        self.needs_sorting = True
+
+    def sort_into_cells(self):
+        self.max_radius = float(self.radii.max()) if len(self.radii) else 0.
+        if self.max_radius > 0:
+            self.cells_per_side = int(min(GridIndex.MAX_CELLS_PER_SIDE, max(1, 1 / (2 * self.max_radius))))
+        else:
+            self.cells_per_side = GridIndex.MAX_CELLS_PER_SIDE
+        self.cell_size = 1 / self.cells_per_side
+
+        cells = self.cell_coordinate(self.positions[:, 0]) * self.cells_per_side + \
+            self.cell_coordinate(self.positions[:, 1])
+        self.cell_starts, self.sorted_indices = self.kernels.sort_into_cells(cells, self.cells_per_side ** 2)
+        self.needs_sorting = False
+
+    def get_number_of_nodes(self):
+        return self.cells_per_side ** 2
+
+    def cell_coordinate(self, coordinate):
+        return np.clip(np.floor(np.asarray(coordinate) / self.cell_size).astype(np.int64),
+                       0, self.cells_per_side - 1)
+
+    def cell_span(self, lower, upper):
+        """
+        Inclusive range of cell coordinates covering [lower, upper]. On a
+        periodic grid the range may run off either end and is wrapped later.
+        """
+        lower = np.floor(np.asarray(lower) / self.cell_size).astype(np.int64)
+        upper = np.floor(np.asarray(upper) / self.cell_size).astype(np.int64)
+        if self.periodic:
+            return lower, np.minimum(upper, lower + self.cells_per_side - 1)
+        return np.clip(lower, 0, self.cells_per_side - 1), np.clip(upper, 0, self.cells_per_side - 1)
+
+    def indices_in_cells(self, lower_x, upper_x, lower_y, upper_y):
+        """
+        For each row, every stored index in the block of cells with the given
+        (inclusive) cell coordinates. Returns (row, stored index).
+        """
+        columns = upper_y - lower_y + 1
+        rows, cell_offsets = expand_ranges(np.zeros(len(lower_x), dtype=np.int64),
+                                           (upper_x - lower_x + 1) * columns)
+        cells = ((lower_x[rows] + cell_offsets // columns[rows]) % self.cells_per_side) * self.cells_per_side + \
+            (lower_y[rows] + cell_offsets % columns[rows]) % self.cells_per_side
+        cell_rows, sorted_positions = expand_ranges(self.cell_starts[cells],
+                                                    self.cell_starts[cells + 1] - self.cell_starts[cells])
+        return rows[cell_rows], self.sorted_indices[sorted_positions]
+
+    def candidate_pairs(self, positions, radii):
+        if self.needs_sorting:
+            self.sort_into_cells()
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        reach = np.asarray(radii, dtype=float) + self.max_radius
+        return self.indices_in_cells(
+            *self.cell_span(positions[:, 0] - reach, positions[:, 0] + reach),
+            *self.cell_span(positions[:, 1] - reach, positions[:, 1] + reach)
+        )
+
+    def query(self, p_rect: Rectangle):
+        if self.needs_sorting:
+            self.sort_into_cells()
+        _rows, indices = self.indices_in_cells(
+            *self.cell_span([p_rect.x - self.max_radius], [p_rect.x + p_rect.width + self.max_radius]),
+            *self.cell_span([p_rect.y - self.max_radius], [p_rect.y + p_rect.height + self.max_radius])
+        )
+        half_size = np.array([p_rect.width / 2, p_rect.height / 2])
+        separation = self.positions[indices] - (np.array([p_rect.x, p_rect.y]) + half_size)
+        if self.periodic:
+            separation = minimum_image(separation)
+        overlapping = np.all(np.abs(separation) <= half_size + self.radii[indices, np.newaxis], axis=1)
+        indices = np.unique(indices[overlapping])
+        if self.items is None:
+            return indices.tolist()
+        return [self.items[index] for index in indices]
@@ -1,85 +1,151 @@
-from environment import Environment
+import threading
+from environment import Environment, EnvironmentSnapshot
+from organisms import Organisms
+from recorder import StatisticsRecorder
+from quad_tree import Rectangle
+from simulation_server import SharedSimulation
 from bokeh.layouts import row, column
-from bokeh.models import ColorBar, LinearColorMapper, WheelZoomTool, Range1d, Select
+from bokeh.palettes import Category10_10, Greens256
+from bokeh.models import ColorBar, LinearColorMapper, LogColorMapper, WheelZoomTool, Range1d, Select
 from bokeh.plotting import ColumnDataSource, Figure
-from statistics import EnvironmentStatistics, BlobStatistics
-from controls import ControlPanel, PausePlayControlFunctions
+from statistics import BlobStatistics
+from controls import ControlPanel, PausePlayControlFunctions, SpeedControlFunctions, SkipForwardControlFunctions
 from bokeh.plotting import curdoc
 from components import Component
+import numpy as np
 
 
 class App:
-
-    def __init__(self, environment: Environment):
-        self.environment = environment
-        self.environment_view = EnvironmentView(environment)
-        self.scatter_diagram = ScatterDiagram(environment)
-
-        self.play_periodic_callback = None
+    """
+    One session's view of a SharedSimulation. Everything it changes in the
+    environment is queued on the simulation's worker.
+    """
+
+    def __init__(self, simulation: SharedSimulation):
+        self.simulation = simulation
+        self.environment = simulation.environment
+        self.worker = simulation.worker
+        self.document = curdoc()
+        self.snapshot_lock = threading.Lock()
+        self.latest_snapshot = None
+        self.refresh_scheduled = False
+
+        self.environment_view = EnvironmentView(self.environment)
+        self.scatter_diagram = ScatterDiagram(self.environment)
+        self.recorder = simulation.recorder
+        self.population_graph = PopulationGraph(self.recorder)
+
+        self.skip_forward_job = None
+        self.control_panel = ControlPanel(
+            self.environment,
+            PausePlayControlFunctions(
+                play_function=self.play,
+                pause_function=self.pause,
+                is_playing_function=self.worker.is_playing
+            ),
+            SpeedControlFunctions(
+                get_steps_per_frame_function=lambda: self.worker.steps_per_frame,
+                set_steps_per_frame_function=self.worker.set_steps_per_frame
+            ),
+            SkipForwardControlFunctions(
+                skip_forward_function=self.skip_forward,
+                cancel_function=self.cancel_skip_forward
+            ),
+            synchronise=self.worker.queued
+        )
 
         self.app = row(
             column(
                 self.environment_view.get_component(),
-                PopulationGraph(environment, [
-                    EnvironmentStatistics.number_of_foods,
-                    EnvironmentStatistics.number_of_blobs
-                ]).get_component()
+                self.population_graph.get_component()
             ),
             column(
                 self.scatter_diagram.get_component(),
-                ControlPanel(environment, PausePlayControlFunctions(
-                    play_function=self.play,
-                    pause_function=self.pause,
-                    is_playing_function=lambda: not (self.play_periodic_callback is None)
-                )).get_component()
+                self.control_panel.get_component()
             )
         )
 
+        self.simulation.subscribe(self.publish_snapshot)
+
     def get_app(self):
         return self.app
 
-    def refresh(self):
-        self.environment_view.refresh()
-        self.scatter_diagram.refresh()
+    def publish_snapshot(self, snapshot: EnvironmentSnapshot):
+        # Called from the worker thread. Only the latest snapshot is drawn, and at
+        # most one refresh is queued on the document at a time.
+        with self.snapshot_lock:
+            self.latest_snapshot = snapshot
+            if self.refresh_scheduled:
+                return
+            self.refresh_scheduled = True
+        self.document.add_next_tick_callback(self.refresh_latest_snapshot)
+
+    def refresh_latest_snapshot(self):
+        with self.snapshot_lock:
+            snapshot = self.latest_snapshot
+            self.refresh_scheduled = False
+        self.refresh(snapshot)
+
+    def refresh(self, snapshot: EnvironmentSnapshot):
+        self.environment_view.refresh(snapshot)
+        self.scatter_diagram.refresh(snapshot)
+        self.population_graph.refresh()
+        self.control_panel.refresh(snapshot)
+
+    def skip_forward(self, steps):
+        def report_progress(job):
+            # Called from the worker thread
+            self.document.add_next_tick_callback(
+                lambda: self.control_panel.action_centre.show_skip_forward_progress(job))
+
+        self.skip_forward_job = self.worker.skip_forward(steps, report_progress)
+
+    def cancel_skip_forward(self):
+        if self.skip_forward_job is not None:
+            self.skip_forward_job.cancel()
 
     def play(self):
-        if self.play_periodic_callback is None:
-            def callback():
-                self.environment.iterate()
-                self.refresh()
-
-            self.play_periodic_callback = curdoc().add_periodic_callback(callback, 10)
+        self.worker.play()
 
     def pause(self):
-        if self.play_periodic_callback is None:
-            return
-        curdoc().remove_periodic_callback(self.play_periodic_callback)
-        self.play_periodic_callback = None
+        self.worker.pause()
+
+    def stop(self):
+        """
+        Stops following the simulation, which carries on for other sessions.
+        """
+        self.simulation.unsubscribe(self.publish_snapshot)
 
 
 class EnvironmentView:
+    """
+    Draws blobs and food at a level of detail that suits the zoom and the
+    population. Blobs whose eyes would be under MIN_EYE_PIXELS across are
+    drawn without them, above density_threshold blobs a density image
+    binned on the server replaces the blob glyphs, and when zoomed in only
+    what lies in the viewport is sent to the browser.
+    """
     QUAD_TREE_DEBUG_MODE = False
+    DENSITY_THRESHOLD = 5000
+    DENSITY_BINS = 200
+    DENSITY_PALETTE = Greens256[::-1]
+    MIN_EYE_PIXELS = 1.
 
-    def __init__(self, environment: Environment):
+    def __init__(self, environment: Environment, density_threshold=DENSITY_THRESHOLD):
         self.environment = environment
-
-        self.blobs_data_source = ColumnDataSource(data=dict(x=[],
-                                                            y=[],
-                                                            radius=[],
-                                                            alpha=[],
-                                                            left_eye_x=[],
-                                                            right_eye_x=[],
-                                                            left_eye_y=[],
-                                                            right_eye_y=[],
-                                                            eye_radius=[],
-                                                            iris_radius=[]
-                                                            )
-                                                  )
-        self.food_data_source = ColumnDataSource(data=dict(x=[],
-                                                           y=[],
-                                                           radius=[]
-                                                           )
-                                                 )
+        self.density_threshold = density_threshold
+        self.document = curdoc()
+        self.latest_snapshot = None
+        self.viewport_refresh_scheduled = False
+
+        self.blobs_data = IncrementalDataSource(['x', 'y', 'radius', 'alpha'])
+        self.blobs_data_source = self.blobs_data.data_source
+        self.eyes_data = IncrementalDataSource(['alpha', 'left_eye_x', 'right_eye_x', 'left_eye_y', 'right_eye_y',
+                                                'eye_radius', 'iris_radius'])
+        self.eyes_data_source = self.eyes_data.data_source
+        self.food_data = IncrementalDataSource(['x', 'y', 'radius'])
+        self.food_data_source = self.food_data.data_source
+        self.density_data_source = ColumnDataSource(data=dict(image=[], x=[], y=[], dw=[], dh=[]))
 
         self.reachable_org = ColumnDataSource(data=dict(x=[],
                                                         y=[]
@@ -104,6 +170,11 @@ class EnvironmentView:
         self.view.xaxis.major_label_text_font_size = '0pt'  # preferred method for removing tick labels
         self.view.yaxis.major_label_text_font_size = '0pt'  # preferred method for removing tick labels
         self.view.add_tools(WheelZoomTool())
+        self.density_renderer = self.view.image(image='image', x='x', y='y', dw='dw', dh='dh',
+                                                color_mapper=LogColorMapper(palette=EnvironmentView.DENSITY_PALETTE,
+                                                                            nan_color=(0, 0, 0, 0)),
+                                                source=self.density_data_source,
+                                                visible=False)
         self.view.circle('x', 'y',
                          radius='radius',
                          fill_alpha='alpha',
@@ -114,28 +185,28 @@ class EnvironmentView:
                          )
         self.view.circle('left_eye_x', 'left_eye_y',
                          radius='eye_radius',
-                         source=self.blobs_data_source,
+                         source=self.eyes_data_source,
                          alpha='alpha',
                          fill_color='white',
                          line_color='black'
                          )
         self.view.circle('right_eye_x', 'right_eye_y',
                          radius='eye_radius',
-                         source=self.blobs_data_source,
+                         source=self.eyes_data_source,
                          alpha='alpha',
                          fill_color='white',
                          line_color='black'
                          )
         self.view.circle('left_eye_x', 'left_eye_y',
                          radius='iris_radius',
-                         source=self.blobs_data_source,
+                         source=self.eyes_data_source,
                          alpha='alpha',
                          fill_color='black',
                          line_color='black'
                          )
         self.view.circle('right_eye_x', 'right_eye_y',
                          radius='iris_radius',
-                         source=self.blobs_data_source,
+                         source=self.eyes_data_source,
                          alpha='alpha',
                          fill_color='black',
                          line_color='black'
@@ -160,51 +231,197 @@ class EnvironmentView:
                          line_color='blue'
                          )
 
-    def refresh(self):
-        self.refresh_blobs_data()
-        self.refresh_food_data()
-        self.refresh_tracker_data()
+        for view_range in (self.view.x_range, self.view.y_range):
+            view_range.on_change('start', lambda _attr, _old, _new: self.schedule_viewport_refresh())
+            view_range.on_change('end', lambda _attr, _old, _new: self.schedule_viewport_refresh())
+
+    def refresh(self, snapshot: EnvironmentSnapshot):
+        self.latest_snapshot = snapshot
+        viewport = self.get_viewport()
+        show_density = len(snapshot.population) > self.density_threshold
+        self.density_renderer.visible = show_density
+        if show_density:
+            self.refresh_density_data(snapshot, viewport)
+            self.blobs_data.update(np.zeros(0, dtype=np.int64), {name: [] for name in self.blobs_data_source.data})
+            self.eyes_data.update(np.zeros(0, dtype=np.int64), {name: [] for name in self.eyes_data_source.data})
+        else:
+            self.refresh_blobs_data(snapshot, viewport)
+        self.refresh_food_data(snapshot, viewport)
+        self.refresh_tracker_data(snapshot)
+
+    def schedule_viewport_refresh(self):
+        # Zooming moves both ranges at once, so redraw the latest snapshot once after them
+        if self.viewport_refresh_scheduled or self.latest_snapshot is None:
+            return
+        self.viewport_refresh_scheduled = True
+        self.document.add_next_tick_callback(self.refresh_viewport)
+
+    def refresh_viewport(self):
+        self.viewport_refresh_scheduled = False
+        self.refresh(self.latest_snapshot)
 
     def get_component(self):
         return self.view
 
-    def refresh_blobs_data(self):
-        self.blobs_data_source.data = {
-            'x': [organism.get_x_coordinate() for organism in self.environment.organisms.organism_list],
-            'y': [organism.get_y_coordinate() for organism in self.environment.organisms.organism_list],
-            'radius': [organism.radius for organism in self.environment.organisms.organism_list],
-            'alpha': [organism.get_capacity_for_birth() for organism in self.environment.organisms.organism_list],
-            'left_eye_x': [organism.left_eye_position()[0] for organism in self.environment.organisms.organism_list],
-            'right_eye_x': [organism.right_eye_position()[0] for organism in self.environment.organisms.organism_list],
-            'left_eye_y': [organism.left_eye_position()[1] for organism in self.environment.organisms.organism_list],
-            'right_eye_y': [organism.right_eye_position()[1] for organism in self.environment.organisms.organism_list],
-            'eye_radius': [organism.radius / 5 for organism in self.environment.organisms.organism_list],
-            'iris_radius': [organism.radius / 15 for organism in self.environment.organisms.organism_list]
+    def get_viewport(self):
+        x_range, y_range = self.view.x_range, self.view.y_range
+        return Rectangle(x=x_range.start, y=y_range.start,
+                         width=x_range.end - x_range.start, height=y_range.end - y_range.start)
+
+    def get_pixel_size(self, viewport: Rectangle):
+        return max(viewport.width / self.view.plot_width, viewport.height / self.view.plot_height)
+
+    def refresh_blobs_data(self, snapshot: EnvironmentSnapshot, viewport: Rectangle):
+        population = snapshot.population
+        shown = EnvironmentView.get_shown(population.position, population.radius, viewport)
+        self.blobs_data.update(population.id[shown], EnvironmentView.make_blobs_data(snapshot, shown))
+        with_eyes = np.flatnonzero(shown)[
+            2 * population.radius[shown] / 5 >= EnvironmentView.MIN_EYE_PIXELS * self.get_pixel_size(viewport)]
+        self.eyes_data.update(population.id[with_eyes], EnvironmentView.make_eyes_data(snapshot, with_eyes))
+
+    def refresh_food_data(self, snapshot: EnvironmentSnapshot, viewport: Rectangle):
+        shown = EnvironmentView.get_shown(snapshot.food_positions, snapshot.food_radii, viewport)
+        self.food_data.update(snapshot.food_ids[shown], EnvironmentView.make_food_data(snapshot, shown))
+
+    def refresh_density_data(self, snapshot: EnvironmentSnapshot, viewport: Rectangle):
+        positions = snapshot.population.position
+        counts, _x_edges, _y_edges = np.histogram2d(
+            positions[:, 0], positions[:, 1], bins=EnvironmentView.DENSITY_BINS,
+            range=[[viewport.x, viewport.x + viewport.width], [viewport.y, viewport.y + viewport.height]])
+        # Rows of the image run along y, and empty bins are left transparent
+        image = np.where(counts > 0, counts, np.nan).T
+        self.density_data_source.data = {'image': [image], 'x': [viewport.x], 'y': [viewport.y],
+                                         'dw': [viewport.width], 'dh': [viewport.height]}
+
+    @staticmethod
+    def get_shown(positions, radii, viewport: Rectangle):
+        """
+        Mask of the circles overlapping the viewport, all of them unless
+        zoomed in.
+        """
+        if viewport.x <= 0 and viewport.y <= 0 and viewport.x + viewport.width >= 1 and \
+                viewport.y + viewport.height >= 1:
+            return np.ones(len(radii), dtype=bool)
+        return (positions[:, 0] + radii >= viewport.x) & (positions[:, 0] - radii <= viewport.x + viewport.width) & \
+            (positions[:, 1] + radii >= viewport.y) & (positions[:, 1] - radii <= viewport.y + viewport.height)
+
+    @staticmethod
+    def make_blobs_data(snapshot: EnvironmentSnapshot, shown=slice(None)):
+        population = snapshot.population
+        return {
+            'x': population.position[shown, 0],
+            'y': population.position[shown, 1],
+            'radius': population.radius[shown],
+            'alpha': population.get_capacity_for_birth()[shown]
+        }
+
+    @staticmethod
+    def make_eyes_data(snapshot: EnvironmentSnapshot, shown=slice(None)):
+        population = snapshot.population
+        left_eye_position, right_eye_position = population.get_eye_positions()
+        return {
+            'alpha': population.get_capacity_for_birth()[shown],
+            'left_eye_x': left_eye_position[shown, 0],
+            'right_eye_x': right_eye_position[shown, 0],
+            'left_eye_y': left_eye_position[shown, 1],
+            'right_eye_y': right_eye_position[shown, 1],
+            'eye_radius': population.radius[shown] / 5,
+            'iris_radius': population.radius[shown] / 15
         }
 
-    def refresh_food_data(self):
-        self.food_data_source.data = {
-            'x': [food.get_x_coordinate() for food in self.environment.foodage.food_list],
-            'y': [food.get_y_coordinate() for food in self.environment.foodage.food_list],
-            'radius': [food.radius for food in self.environment.foodage.food_list]
+    @staticmethod
+    def make_food_data(snapshot: EnvironmentSnapshot, shown=slice(None)):
+        return {
+            'x': snapshot.food_positions[shown, 0],
+            'y': snapshot.food_positions[shown, 1],
+            'radius': snapshot.food_radii[shown]
         }
 
-    def refresh_tracker_data(self):
-        if EnvironmentView.QUAD_TREE_DEBUG_MODE:
-            tracked_food_item = self.environment.foodage.food_list[0]
+    def refresh_tracker_data(self, snapshot: EnvironmentSnapshot):
+        if EnvironmentView.QUAD_TREE_DEBUG_MODE and len(snapshot.food_ids) > 0:
+            tracked_position = snapshot.food_positions[0]
+            tracked_radius = snapshot.food_radii[0]
             self.tracker.data = {
-                'x': [tracked_food_item.get_x_coordinate()],
-                'y': [tracked_food_item.get_y_coordinate()],
+                'x': [tracked_position[0]],
+                'y': [tracked_position[1]],
             }
+            spatial_index = Organisms.SPATIAL_INDICES[self.environment.organisms.spatial_index_name]()
+            spatial_index.rebuild(snapshot.population.position, snapshot.population.radius)
+            close_organisms = spatial_index.query(Rectangle(x=tracked_position[0] - tracked_radius,
+                                                            y=tracked_position[1] - tracked_radius,
+                                                            width=2 * tracked_radius,
+                                                            height=2 * tracked_radius))
             self.reachable_org.data = {
-                'x': [org.get_x_coordinate() for org in
-                      self.environment.organisms.find_close_organisms(tracked_food_item.bounding_box)],
-                'y': [org.get_y_coordinate() for org in
-                      self.environment.organisms.find_close_organisms(tracked_food_item.bounding_box)],
+                'x': snapshot.population.position[close_organisms, 0],
+                'y': snapshot.population.position[close_organisms, 1],
             }
 
 
+class IncrementalDataSource:
+    """
+    Keeps a ColumnDataSource in step with rows that have stable ids, keep
+    their relative order and are only ever appended at the end or removed.
+
+    Columns are sent as NumPy arrays so Bokeh transfers them in binary. Once
+    there are at least INCREMENTAL_UPDATE_THRESHOLD rows and none have been
+    removed, only the values that changed are patched and new rows are
+    streamed. Patches are sent as JSON, about PATCHED_VALUE_BYTES a value
+    against the 8 bytes of a binary float, so when many values changed the
+    data is replaced wholesale instead.
+    """
+    INCREMENTAL_UPDATE_THRESHOLD = 500
+    PATCHED_VALUE_BYTES = 30
+    REPLACED_VALUE_BYTES = 8
+
+    def __init__(self, columns: [str]):
+        self.data_source = ColumnDataSource(data={column: [] for column in columns})
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.data = {}
+
+    def update(self, ids, data: dict):
+        number_of_shown_rows = len(self.ids)
+        only_appended = len(ids) >= number_of_shown_rows and np.array_equal(ids[:number_of_shown_rows], self.ids)
+        unchanged = only_appended and len(ids) == number_of_shown_rows and \
+            all(np.array_equal(values, self.data.get(name)) for name, values in data.items())
+        if unchanged:
+            return
+        changed_rows = {}
+        if only_appended and number_of_shown_rows > 0 and \
+                len(ids) >= IncrementalDataSource.INCREMENTAL_UPDATE_THRESHOLD:
+            changed_rows = {name: np.flatnonzero(np.asarray(values[:number_of_shown_rows]) != self.data[name])
+                            for name, values in data.items()}
+        number_of_patched_values = sum(len(rows) for rows in changed_rows.values())
+        if not changed_rows or number_of_patched_values * IncrementalDataSource.PATCHED_VALUE_BYTES > \
+                len(ids) * len(data) * IncrementalDataSource.REPLACED_VALUE_BYTES:
+            self.data_source.data = {name: np.array(values) for name, values in data.items()}
+        else:
+            patches = {name: list(zip(rows.tolist(), np.asarray(data[name])[rows].tolist()))
+                       for name, rows in changed_rows.items() if len(rows)}
+            if patches:
+                self.data_source.patch(patches)
+            if len(ids) > number_of_shown_rows:
+                self.data_source.stream({name: values[number_of_shown_rows:] for name, values in data.items()})
+        self.ids = np.array(ids)
+        self.data = {name: np.array(values) for name, values in data.items()}
+
+
 class ScatterDiagram(Component):
+    """
+    Colouring by lineage gives each of the most populous founder lineages
+    its own colour and every other lineage the last colour of the palette.
+
+    Above MAX_POINTS organisms the diagram either plots a subsample, the
+    same organisms from frame to frame, or switches to a 2D histogram.
+    """
+    LINEAGE = "lineage"
+    COLOR_PALETTE = 'Cividis11'
+    LINEAGE_PALETTE = Category10_10[:9] + ('#bbbbbb',)
+    COUNT_PALETTE = 'Viridis256'
+
+    MAX_POINTS = 5000
+    SUBSAMPLE = "subsample"
+    HISTOGRAM = "2D histogram"
+    HISTOGRAM_BINS = 50
 
     def __init__(self, environment: Environment):
         super().__init__()
@@ -215,65 +432,127 @@ class ScatterDiagram(Component):
             y_axis=[],
             color=[]
         ))
+        self.histogram_data_source = ColumnDataSource(data=dict(
+            x=[],
+            y=[],
+            width=[],
+            height=[],
+            count=[]
+        ))
         self.diagram = Figure(plot_width=400, plot_height=400)
 
         self.x_axis_menu = Select(title="x axis", value="radius", options=list(BlobStatistics))
         self.y_axis_menu = Select(title="y axis", value="speed", options=list(BlobStatistics))
-        self.color_menu = Select(title="colours", value="time of birth", options=list(BlobStatistics))
-
-        self.color_mapper = LinearColorMapper(palette='Cividis11')
+        self.color_menu = Select(title="colours", value="time of birth",
+                                 options=list(BlobStatistics) + [ScatterDiagram.LINEAGE])
+        self.large_population_menu = Select(title="over {} blobs".format(ScatterDiagram.MAX_POINTS),
+                                            value=ScatterDiagram.SUBSAMPLE,
+                                            options=[ScatterDiagram.SUBSAMPLE, ScatterDiagram.HISTOGRAM])
+
+        self.color_mapper = LinearColorMapper(palette=ScatterDiagram.COLOR_PALETTE)
+        self.count_mapper = LogColorMapper(palette=ScatterDiagram.COUNT_PALETTE)
         self.color_bar = ColorBar(color_mapper=self.color_mapper, location=(0, 0))
-        self.diagram.circle('x_axis', 'y_axis',
-                            color={'field': 'color', 'transform': self.color_mapper},
-                            source=self.data_source)
+        self.scatter_renderer = self.diagram.circle('x_axis', 'y_axis',
+                                                    color={'field': 'color', 'transform': self.color_mapper},
+                                                    source=self.data_source)
+        self.histogram_renderer = self.diagram.rect('x', 'y', 'width', 'height',
+                                                    fill_color={'field': 'count', 'transform': self.count_mapper},
+                                                    line_color=None,
+                                                    source=self.histogram_data_source,
+                                                    visible=False)
         self.diagram.add_layout(self.color_bar, 'right')
 
-        self.component = column(self.diagram, row(self.x_axis_menu, self.y_axis_menu, self.color_menu))
+        self.component = column(self.diagram, row(self.x_axis_menu, self.y_axis_menu, self.color_menu),
+                                self.large_population_menu)
+
+    def refresh(self, snapshot: EnvironmentSnapshot):
+        population = snapshot.population
+        x_axis = BlobStatistics[self.x_axis_menu.value](population, snapshot.current_time)
+        y_axis = BlobStatistics[self.y_axis_menu.value](population, snapshot.current_time)
+
+        show_histogram = len(population) > ScatterDiagram.MAX_POINTS and \
+            self.large_population_menu.value == ScatterDiagram.HISTOGRAM
+        self.scatter_renderer.visible = not show_histogram
+        self.histogram_renderer.visible = show_histogram
+        self.color_bar.color_mapper = self.count_mapper if show_histogram else self.color_mapper
+        if show_histogram:
+            self.refresh_histogram(x_axis, y_axis)
+            return
 
-    def refresh(self):
+        if self.color_menu.value == ScatterDiagram.LINEAGE:
+            color = ScatterDiagram.rank_lineages(population.founder_id, len(ScatterDiagram.LINEAGE_PALETTE))
+            self.color_mapper.update(palette=ScatterDiagram.LINEAGE_PALETTE, low=0,
+                                     high=len(ScatterDiagram.LINEAGE_PALETTE) - 1)
+        else:
+            color = BlobStatistics[self.color_menu.value](population, snapshot.current_time)
+            self.color_mapper.update(palette=ScatterDiagram.COLOR_PALETTE, low=None, high=None)
+
+        shown = slice(None)
+        if len(population) > ScatterDiagram.MAX_POINTS:
+            shown = ScatterDiagram.subsample(population.id, ScatterDiagram.MAX_POINTS)
         self.data_source.data = {
-            'x_axis': [BlobStatistics[self.x_axis_menu.value](organism, self.environment)
-                       for organism in self.environment.organisms.organism_list],
-            'y_axis': [BlobStatistics[self.y_axis_menu.value](organism, self.environment)
-                       for organism in self.environment.organisms.organism_list],
-            'color': [BlobStatistics[self.color_menu.value](organism, self.environment)
-                      for organism in self.environment.organisms.organism_list]
+            'x_axis': np.array(x_axis[shown]),
+            'y_axis': np.array(y_axis[shown]),
+            'color': np.array(color[shown])
+        }
+
+    def refresh_histogram(self, x_axis, y_axis):
+        counts, x_edges, y_edges = np.histogram2d(x_axis, y_axis, bins=ScatterDiagram.HISTOGRAM_BINS)
+        x_bins, y_bins = np.nonzero(counts)
+        self.histogram_data_source.data = {
+            'x': (x_edges[x_bins] + x_edges[x_bins + 1]) / 2,
+            'y': (y_edges[y_bins] + y_edges[y_bins + 1]) / 2,
+            'width': x_edges[x_bins + 1] - x_edges[x_bins],
+            'height': y_edges[y_bins + 1] - y_edges[y_bins],
+            'count': counts[x_bins, y_bins]
         }
+        self.data_source.data = {'x_axis': [], 'y_axis': [], 'color': []}
+
+    @staticmethod
+    def subsample(ids, number_of_points):
+        """
+        Mask keeping about number_of_points organisms, chosen by hashing
+        their ids so the same ones are kept while they live.
+        """
+        hashed = (ids.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(40)
+        return hashed < np.uint64(number_of_points / len(ids) * 2 ** 24)
+
+    @staticmethod
+    def rank_lineages(founder_ids, number_of_colors):
+        """
+        0 for the organisms of the most populous lineage, 1 for the next and
+        so on, with every lineage past the last colour sharing it.
+        """
+        founders, lineages, sizes = np.unique(founder_ids, return_inverse=True, return_counts=True)
+        rank = np.empty(len(founders), dtype=np.int64)
+        rank[np.argsort(-sizes, kind="stable")] = np.arange(len(founders))
+        return np.minimum(rank[lineages], number_of_colors - 1)
 
 
 class PopulationGraph:
+    """
+    Plots the full resolution samples of a StatisticsRecorder. Points are
+    streamed with rollover, so the browser holds at most ROLLOVER of them.
+    """
+    ROLLOVER = 1000
 
-    def __init__(self, environment: Environment, statistics: [dict], snapshot_interval=100):
-        self.environment = environment
-        self.statistics = statistics
-        self.number_of_statistics = len(statistics)
+    def __init__(self, recorder: StatisticsRecorder):
+        self.recorder = recorder
+        self.number_of_samples_shown = 0
 
-        self.data_sources = []
+        self.data_source = ColumnDataSource(data={name: [] for name in ['time'] + recorder.names})
         self.graph = Figure(plot_width=600, plot_height=200)
-        self.set_up_graph_lines()
+        for name, statistic in recorder.statistics.items():
+            self.graph.line('time', name, source=self.data_source, line_color=statistic['color'])
 
         self.graph.x_range.follow = "end"
-        self.graph.x_range.follow_interval = 50
-
-        self.snapshot_interval = snapshot_interval
-
-        self.environment.add_data_callback(self.upload_iteration)
-
-    def set_up_graph_lines(self):
-        for i in range(self.number_of_statistics):
-            self.data_sources += [ColumnDataSource(data=dict(
-                time=[],
-                value=[]
-            ))]
-            self.graph.line('time', 'value', source=self.data_sources[i], line_color=self.statistics[i]['color'])
-
-    def upload_iteration(self):
-        if self.environment.current_time % self.snapshot_interval == 0:
-            for i in range(self.number_of_statistics):
-                self.data_sources[i].stream({
-                    'time': [self.environment.current_time / self.snapshot_interval],
-                    'value': [self.statistics[i]['function'](self.environment)]
-                })
+        self.graph.x_range.follow_interval = 50 * recorder.snapshot_interval
+
+    def refresh(self):
+        samples, self.number_of_samples_shown = self.recorder.get_samples_since(self.number_of_samples_shown)
+        if len(samples['time']) == 0:
+            return
+        self.data_source.stream(samples, rollover=PopulationGraph.ROLLOVER)
 
     def get_component(self):
         return self.graph
@@ -1,5 +1,21 @@
+import numpy as np
+
+
 def str_an_array(array):
     s = ""
     for i in array:
         s += str(i)
     return s
+
+
+def minimum_image(separation, period=1):
+    return separation - period * np.round(np.asarray(separation) / period)
+
+
+def wrapped_intervals(start, length, period=1):
+    start = start % period
+    if length >= period:
+        return [(0, period)]
+    if start + length <= period:
+        return [(start, length)]
+    return [(start, period - start), (0, start + length - period)]
@@ -0,0 +1,104 @@
+import warnings
+import numpy as np
+from blob import Blob
+from helpers import minimum_image
+
+NO_EATER = -1
+
+
+class NumpyKernels:
+    """
+    The inner loops of a time step, in NumPy. This is the reference that
+    other kernel backends are checked against.
+    """
+    name = "numpy"
+
+    @staticmethod
+    def move(position, angle, speed, radius, energy, angle_noise):
+        """
+        One step of movement and metabolism, in place. Every organism is
+        handled on its own, so any subset of rows can be moved separately
+        with the same result.
+        """
+        velocity = speed[:, np.newaxis] * np.column_stack((np.cos(angle), np.sin(angle)))
+        position += speed[:, np.newaxis] * velocity
+        position -= np.floor(position)
+
+        angle += angle_noise * speed
+        energy -= 0.5 * speed * speed * (radius ** 2 * Blob.MASS_TO_RADIUS_SQUARED)
+
+    @staticmethod
+    def move_steps(position, angle, speed, radius, energy, angle_noise):
+        """
+        One move per row of angle_noise, with the same result as calling move
+        for each row in turn. Angles and the trigonometry are done for all
+        the steps at once, leaving a cheap loop over steps for the positions.
+        """
+        angles = np.add.accumulate(np.concatenate((angle[np.newaxis], angle_noise * speed)))
+        velocities = speed[:, np.newaxis] * np.stack((np.cos(angles[:-1]), np.sin(angles[:-1])), axis=-1)
+        steps = speed[:, np.newaxis] * velocities
+        metabolic_cost = 0.5 * speed * speed * (radius ** 2 * Blob.MASS_TO_RADIUS_SQUARED)
+        for step in steps:
+            position += step
+            position -= np.floor(position)
+            energy -= metabolic_cost
+        angle[:] = angles[-1]
+
+    @staticmethod
+    def sort_into_cells(cells, number_of_cells):
+        """
+        (start of each cell and one past the end, item indices stably
+        sorted by cell) for a cell list.
+        """
+        counts = np.bincount(cells, minlength=number_of_cells)
+        return np.concatenate(([0], np.cumsum(counts))), np.argsort(cells, kind="stable")
+
+    @staticmethod
+    def resolve_eaters(food_positions, food_radii, organism_positions, organism_radii, food_indices,
+                       organism_indices, periodic):
+        """
+        For each food, the lowest-indexed organism among its candidate pairs
+        that is larger than it and overlaps it, or NO_EATER.
+        """
+        eaters = np.full(len(food_radii), NO_EATER, dtype=np.int64)
+        if len(food_indices) == 0:
+            return eaters
+
+        separation = organism_positions[organism_indices] - food_positions[food_indices]
+        if periodic:
+            separation = minimum_image(separation)
+        reach = organism_radii[organism_indices] + food_radii[food_indices]
+        eligible = (organism_radii[organism_indices] > food_radii[food_indices]) & \
+                   (np.einsum("ij,ij->i", separation, separation) < reach * reach)
+
+        first_eater = np.full(len(food_radii), len(organism_radii), dtype=np.int64)
+        np.minimum.at(first_eater, food_indices[eligible], organism_indices[eligible])
+        eaten = first_eater < len(organism_radii)
+        eaters[eaten] = first_eater[eaten]
+        return eaters
+
+    @staticmethod
+    def select_parents(energy, next_energy_requirement, starting_energy, candidates):
+        """
+        The candidates with enough energy for their next offspring.
+        """
+        return candidates[energy[candidates] >= next_energy_requirement[candidates] + starting_energy[candidates]]
+
+
+KERNEL_NAMES = ("numpy", "numba")
+
+
+def get_kernels(name="numpy"):
+    """
+    The kernels called name. Numba kernels fall back to NumPy, with a
+    warning, when numba is not installed.
+    """
+    if name not in KERNEL_NAMES:
+        raise KeyError("Unknown kernels '" + name + "', expected one of " + ", ".join(KERNEL_NAMES))
+    if name == "numba":
+        try:
+            from numba_kernels import NumbaKernels
+            return NumbaKernels
+        except ImportError:
+            warnings.warn("numba is not installed, using the NumPy kernels instead")
+    return NumpyKernels
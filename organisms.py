@@ -1,42 +1,57 @@
 from blob import Blob
+from grid_index import GridIndex
+from kernels import NumpyKernels
+from population import Population
+from profiler import NullProfiler
 from quad_tree import Rectangle, QuadTree
 
 
 class Organisms:
-    def __init__(self):
-        self.organism_list = []
-        self.organism_quad_tree = QuadTree(Rectangle(0, 0, 1, 1))
-
-    def update(self, current_time):
-        self.organism_quad_tree = QuadTree(Rectangle(0, 0, 1, 1))
-        for blob in self.organism_list:
-            blob.update(current_time)
-            if blob.is_dead():
-                self.kill_organism(blob, is_in_tree=False)
+    SPATIAL_INDICES = {
+        "quad_tree": lambda kernels=NumpyKernels: QuadTree(Rectangle(0, 0, 1, 1), periodic=True),
+        "grid": lambda kernels=NumpyKernels: GridIndex(periodic=True, kernels=kernels)
+    }
+
+    def __init__(self, parameters, random_streams, spatial_index="grid", kernels=NumpyKernels):
+        self.population = Population(parameters, random_streams, kernels)
+        self.spatial_index_name = spatial_index
+        self.spatial_index = Organisms.SPATIAL_INDICES[spatial_index](kernels)
+
+    @property
+    def organism_list(self):
+        return list(self.population.blobs())
+
+    def update(self, current_time, profiler=NullProfiler(), parallel_engine=None):
+        profiler.count('blobs_updated', len(self.population))
+        with profiler.phase('movement_and_metabolism'):
+            if parallel_engine is None:
+                self.population.update(current_time)
             else:
-                for offspring in blob.produce_offspring(current_time):
-                    self.add_blob(offspring)
-                self.organism_quad_tree.insert(blob)
-
-    def add_blob(self, blob):
-        self.organism_list += [blob]
-        self.organism_quad_tree.insert(blob)
+                parallel_engine.update_population(self.population, current_time)
+        with profiler.phase('deaths'):
+            profiler.count('deaths', self.population.remove_dead())
+        with profiler.phase('reproduction'):
+            births = self.population.produce_offspring(current_time)
+            profiler.count('births', births.stop - births.start)
+        with profiler.phase('spatial_index'):
+            self.rebuild_spatial_index()
+        if profiler.enabled:
+            profiler.count('spatial_index_nodes', self.spatial_index.get_number_of_nodes())
+
+    def rebuild_spatial_index(self):
+        self.spatial_index.rebuild(self.population.position, self.population.radius)
 
     def add_random_blobs(self, number_of_new_blobs=1, current_time=0):
-        for i in range(number_of_new_blobs):
-            new_blob = Blob(time_of_birth=current_time)
-            self.add_blob(new_blob)
+        self.population.add_blobs(number_of_new_blobs, time_of_birth=current_time)
+        self.rebuild_spatial_index()
 
-    def kill_organism(self, organism, is_in_tree=True):
-        self.organism_list.remove(organism)
-        if is_in_tree:
-            self.organism_quad_tree.remove(organism)
+    def kill_organism(self, organism: Blob, current_time=0):
+        self.population.kill(organism.handle, current_time)
 
     def find_close_organisms(self, domain: Rectangle):
-        close_organisms = []
-        self.organism_quad_tree.retrieve_close_objects(domain, close_organisms)
-        return close_organisms
+        return [self.population.blob(index) for index in self.spatial_index.query(domain)
+                if self.population.time_of_death[index] == Population.NOT_DEAD]
 
     def update_extrema_of_organisms(self):
-        for organism in self.organism_list:
-            organism.restrict_to_extrema()
+        self.population.restrict_to_extrema()
+        self.rebuild_spatial_index()
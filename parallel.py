@@ -0,0 +1,200 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from consumption import find_eaters, NO_EATER
+from helpers import minimum_image
+from kernels import NumpyKernels, get_kernels
+from population import Population
+
+
+class SharedArrays:
+    """
+    Named arrays in shared memory, each in a block of its own that is
+    replaced by one twice the size whenever it runs out of room. Workers
+    find them through get_layout() and attach_arrays.
+    """
+
+    def __init__(self):
+        self.blocks = {}
+        self.layout = {}
+
+    def get(self, name, dtype, shape):
+        dtype = np.dtype(dtype)
+        number_of_bytes = max(1, int(np.prod(shape)) * dtype.itemsize)
+        block = self.blocks.get(name)
+        if block is None or block.size < number_of_bytes:
+            if block is not None:
+                block.close()
+                block.unlink()
+            block = shared_memory.SharedMemory(create=True, size=2 * number_of_bytes)
+            self.blocks[name] = block
+        self.layout[name] = (block.name, dtype.str, tuple(shape))
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def put(self, name, values):
+        values = np.asarray(values)
+        self.get(name, values.dtype, values.shape)[...] = values
+
+    def get_layout(self):
+        return dict(self.layout)
+
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+        self.layout = {}
+
+
+# Blocks a worker process has attached to, by block name
+attached_blocks = {}
+
+
+def attach_arrays(layout: dict):
+    """
+    The arrays of a SharedArrays layout, in a worker process. Blocks the
+    engine has since replaced are let go.
+    """
+    block_names = {block_name for block_name, _dtype, _shape in layout.values()}
+    for block_name in set(attached_blocks) - block_names:
+        attached_blocks.pop(block_name).close()
+    arrays = {}
+    for name, (block_name, dtype, shape) in layout.items():
+        if block_name not in attached_blocks:
+            attached_blocks[block_name] = shared_memory.SharedMemory(name=block_name)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=attached_blocks[block_name].buf)
+    return arrays
+
+
+def get_tile_rows(arrays, kind, tiles):
+    order, starts = arrays[kind + "_order"], arrays[kind + "_tile_starts"]
+    return np.concatenate([order[starts[tile]:starts[tile + 1]] for tile in tiles] + [np.zeros(0, dtype=np.int64)])
+
+
+def move_tiles(layout, tiles, kernels_name):
+    """
+    Movement and metabolism of the organisms in the given tiles.
+    """
+    arrays = attach_arrays(layout)
+    rows = get_tile_rows(arrays, "organism", tiles)
+    position, angle, energy = arrays["position"][rows], arrays["angle"][rows], arrays["energy"][rows]
+    get_kernels(kernels_name).move(position, angle, arrays["speed"][rows], arrays["radius"][rows], energy,
+                                   arrays["angle_noise"][rows])
+    arrays["position"][rows] = position
+    arrays["angle"][rows] = angle
+    arrays["energy"][rows] = energy
+
+
+def find_eaters_in_tiles(layout, tiles, kernels_name, tiles_per_side, reach):
+    """
+    Eaters of the food in the given tiles, looked for among the organisms
+    in those tiles and the halo of neighbouring organisms within reach.
+    """
+    arrays = attach_arrays(layout)
+    tile_size = 1 / tiles_per_side
+    rings = math.ceil(reach / tile_size)
+    offsets = np.arange(-rings, rings + 1)
+    for tile in tiles:
+        foods = get_tile_rows(arrays, "food", [tile])
+        if len(foods) == 0:
+            continue
+        tile_x, tile_y = divmod(tile, tiles_per_side)
+        neighbours = np.unique(((tile_x + offsets[:, np.newaxis]) % tiles_per_side) * tiles_per_side +
+                               (tile_y + offsets[np.newaxis, :]) % tiles_per_side)
+        candidates = get_tile_rows(arrays, "organism", neighbours)
+        # Food centres lie in the tile, so nothing further from it than reach can overlap them
+        tile_centre = (np.array([tile_x, tile_y]) + 0.5) * tile_size
+        outside = np.maximum(np.abs(minimum_image(arrays["position"][candidates] - tile_centre)) - tile_size / 2, 0)
+        organisms = np.sort(candidates[np.einsum("ij,ij->i", outside, outside) <= reach * reach])
+
+        # Organisms are in row order, so the lowest local index is also the lowest row
+        eaters = find_eaters(arrays["food_position"][foods], arrays["food_radius"][foods],
+                             arrays["position"][organisms], arrays["radius"][organisms], periodic=True,
+                             kernels=get_kernels(kernels_name))
+        eaten = eaters != NO_EATER
+        eaters[eaten] = organisms[eaters[eaten]]
+        arrays["eaters"][foods] = eaters
+
+
+class ParallelEngine:
+    """
+    Runs movement, metabolism and the search for food eaters on a process
+    pool. The unit torus is cut into tiles_per_side x tiles_per_side tiles
+    and each worker handles a group of them, reading and writing columns
+    copied into shared memory. Eater searches also look at the halo of
+    organisms in neighbouring tiles that can reach into the tile.
+
+    Random numbers are drawn, and births, deaths and food removals
+    resolved, on the calling process in the same order as the serial path,
+    so a seed gives the same run either way.
+    """
+    TILES_PER_SIDE = 4
+
+    def __init__(self, number_of_workers=None, tiles_per_side=TILES_PER_SIDE, kernels=NumpyKernels):
+        self.number_of_workers = os.cpu_count() if number_of_workers is None else number_of_workers
+        self.tiles_per_side = tiles_per_side
+        self.kernels = kernels
+        self.tile_groups = [tiles for tiles in np.array_split(np.arange(tiles_per_side ** 2), self.number_of_workers)
+                            if len(tiles)]
+        self.shared_arrays = SharedArrays()
+        # Spawned rather than forked, as the GUI runs the simulation next to other threads
+        self.executor = ProcessPoolExecutor(max_workers=self.number_of_workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+
+    def sort_into_tiles(self, kind, positions):
+        cells = np.minimum((positions * self.tiles_per_side).astype(np.int64), self.tiles_per_side - 1)
+        tiles = cells[:, 0] * self.tiles_per_side + cells[:, 1]
+        self.shared_arrays.put(kind + "_order", np.argsort(tiles, kind="stable"))
+        self.shared_arrays.put(kind + "_tile_starts", np.concatenate(
+            ([0], np.cumsum(np.bincount(tiles, minlength=self.tiles_per_side ** 2)))))
+
+    def run_on_tiles(self, function, *arguments):
+        layout = self.shared_arrays.get_layout()
+        futures = [self.executor.submit(function, layout, tiles, self.kernels.name, *arguments)
+                   for tiles in self.tile_groups]
+        for future in futures:
+            future.result()
+
+    def update_population(self, population: Population, current_time: int):
+        """
+        Does what Population.update does.
+        """
+        angle_noise = population.draw_angle_noise()
+        if population.size == 0:
+            return
+        for name in ("position", "angle", "speed", "radius", "energy"):
+            self.shared_arrays.put(name, getattr(population, name))
+        self.shared_arrays.put("angle_noise", angle_noise)
+        self.sort_into_tiles("organism", population.position)
+
+        self.run_on_tiles(move_tiles)
+
+        for name in ("position", "angle", "energy"):
+            setattr(population, name, self.shared_arrays.get(name, population.columns[name].dtype,
+                                                               getattr(population, name).shape))
+        population.mark_starved(current_time)
+
+    def find_eaters(self, food_positions, food_radii, organism_positions, organism_radii):
+        """
+        Same as find_eaters on the unit torus.
+        """
+        if len(food_radii) == 0 or len(organism_radii) == 0:
+            return np.full(len(food_radii), NO_EATER, dtype=np.int64)
+        self.shared_arrays.put("position", organism_positions)
+        self.shared_arrays.put("radius", organism_radii)
+        self.shared_arrays.put("food_position", food_positions)
+        self.shared_arrays.put("food_radius", food_radii)
+        self.shared_arrays.get("eaters", np.int64, (len(food_radii),))
+        self.sort_into_tiles("organism", organism_positions)
+        self.sort_into_tiles("food", food_positions)
+
+        self.run_on_tiles(find_eaters_in_tiles, self.tiles_per_side,
+                          float(organism_radii.max() + food_radii.max()))
+        return np.array(self.shared_arrays.get("eaters", np.int64, (len(food_radii),)))
+
+    def close(self):
+        self.executor.shutdown()
+        self.shared_arrays.close()
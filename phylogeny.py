@@ -0,0 +1,180 @@
+import numpy as np
+from column_store import Column, ColumnStore
+from environment import Environment
+from population import Population
+
+
+class Phylogeny(ColumnStore):
+    """
+    Family tree of the organisms of an Environment, kept up to date from
+    its population's birth and death callbacks. Only the living and their
+    ancestors are kept: each node counts itself while alive plus each kept
+    child, and a node whose count drops to zero is pruned, which may in
+    turn release its parent. Pruned rows are compacted away once they make
+    up half the store, so memory follows the living lineages rather than
+    every organism that ever lived.
+
+    Rows stay in id order, so ids are found by binary search. Organisms
+    alive when the phylogeny is attached become its roots.
+    """
+    NO_ROW = -1
+    TRAITS = ("speed", "radius", "starting_energy")
+
+    COLUMN_TYPES = {
+        "id": (np.int64, ()),
+        "parent_id": (np.int64, ()),
+        "founder_id": (np.int64, ()),
+        "depth": (np.int64, ()),
+        "time_of_birth": (np.int64, ()),
+        "time_of_death": (np.int64, ()),
+        "speed": (np.float64, ()),
+        "radius": (np.float64, ()),
+        "starting_energy": (np.float64, ()),
+        "references": (np.int64, ()),
+        "pruned": (np.bool_, ())
+    }
+
+    id = Column()
+    parent_id = Column()
+    founder_id = Column()
+    depth = Column()
+    time_of_birth = Column()
+    time_of_death = Column()
+    speed = Column()
+    radius = Column()
+    starting_energy = Column()
+    references = Column()
+    pruned = Column()
+
+    def __init__(self, environment: Environment):
+        super().__init__()
+        self.number_pruned = 0
+        population = environment.organisms.population
+        self.record_births(population, slice(0, len(population)))
+        population.add_birth_callback(self.record_births)
+        population.add_death_callback(self.record_deaths)
+
+    def get_rows_of_ids(self, ids):
+        """
+        Rows of the kept nodes with the given ids, NO_ROW for the others.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.size == 0:
+            return np.full(len(ids), Phylogeny.NO_ROW)
+        rows = np.minimum(np.searchsorted(self.id, ids), self.size - 1)
+        found = (self.id[rows] == ids) & ~self.pruned[rows]
+        return np.where(found, rows, Phylogeny.NO_ROW)
+
+    def get_parent_rows(self, rows):
+        return self.get_rows_of_ids(self.parent_id[rows])
+
+    def record_births(self, population: Population, rows):
+        new = self.append_rows(len(population.id[rows]))
+        for name in ("id", "parent_id", "founder_id", "time_of_birth", "speed", "radius", "starting_energy"):
+            self.columns[name][new] = getattr(population, name)[rows]
+        self.columns["time_of_death"][new] = Population.NOT_DEAD
+        self.columns["references"][new] = 1
+        self.columns["pruned"][new] = False
+
+        parent_rows = self.get_parent_rows(new)
+        has_parent = parent_rows != Phylogeny.NO_ROW
+        self.columns["depth"][new] = np.where(has_parent, self.depth[parent_rows] + 1, 0)
+        np.add.at(self.references, parent_rows[has_parent], 1)
+
+    def record_deaths(self, population: Population, rows):
+        dead = self.get_rows_of_ids(population.id[rows])
+        found = dead != Phylogeny.NO_ROW
+        self.time_of_death[dead[found]] = population.time_of_death[rows][found]
+        self.release(dead[found])
+        if self.number_pruned > self.size // 2:
+            self.keep(~self.pruned)
+            self.number_pruned = 0
+
+    def release(self, rows):
+        """
+        Drops one reference from each row, pruning those left without any
+        and releasing their parents in turn.
+        """
+        while len(rows) > 0:
+            np.subtract.at(self.references, rows, 1)
+            rows = np.unique(rows[self.references[rows] == 0])
+            parent_rows = self.get_parent_rows(rows)
+            self.pruned[rows] = True
+            self.number_pruned += len(rows)
+            rows = parent_rows[parent_rows != Phylogeny.NO_ROW]
+
+    def get_living_rows(self):
+        return np.flatnonzero(~self.pruned & (self.time_of_death == Population.NOT_DEAD))
+
+    def get_lineage(self, organism_id):
+        """
+        Ids, birth times and traits of an organism and its ancestors,
+        newest first, to see when a strategy emerged along the lineage.
+        """
+        rows = []
+        row = self.get_rows_of_ids([organism_id])[0]
+        while row != Phylogeny.NO_ROW:
+            rows += [row]
+            row = self.get_parent_rows([row])[0]
+        rows = np.array(rows, dtype=np.int64)
+        lineage = {"id": self.id[rows], "time_of_birth": self.time_of_birth[rows]}
+        for trait in Phylogeny.TRAITS:
+            lineage[trait] = getattr(self, trait)[rows]
+        return lineage
+
+    def get_ancestors_at_depth(self, rows, depth):
+        """
+        The ancestor at the given depth of each row, or NO_ROW where the
+        row is shallower or its line is cut off above it.
+        """
+        rows = np.asarray(rows, dtype=np.int64).copy()
+        deeper = np.flatnonzero(self.depth[rows] > depth)
+        while len(deeper) > 0:
+            rows[deeper] = self.get_parent_rows(rows[deeper])
+            deeper = deeper[rows[deeper] != Phylogeny.NO_ROW]
+            deeper = deeper[self.depth[rows[deeper]] > depth]
+        reached = (rows != Phylogeny.NO_ROW)
+        reached[reached] = self.depth[rows[reached]] == depth
+        return np.where(reached, rows, Phylogeny.NO_ROW)
+
+    def most_recent_common_ancestor(self, organism_ids=None):
+        """
+        Id of the most recent common ancestor of the given organisms, by
+        default all living ones, or None if they share no kept ancestor.
+        Climbs all lineages together, one generation per step.
+        """
+        rows = self.get_living_rows() if organism_ids is None else self.get_rows_of_ids(organism_ids)
+        if len(rows) == 0 or (rows == Phylogeny.NO_ROW).any():
+            return None
+        rows = np.unique(rows)
+        while len(rows) > 1:
+            deepest = self.depth[rows] == self.depth[rows].max()
+            parent_rows = self.get_parent_rows(rows[deepest])
+            if (parent_rows == Phylogeny.NO_ROW).any():
+                return None
+            rows = np.unique(np.concatenate((rows[~deepest], parent_rows)))
+        return int(self.id[rows[0]])
+
+    def get_surviving_founders(self):
+        """
+        {founder id: number of living descendants} for every founder whose
+        lineage survives, most successful first.
+        """
+        founders, counts = np.unique(self.founder_id[self.get_living_rows()], return_counts=True)
+        order = np.argsort(-counts, kind="stable")
+        return dict(zip(founders[order].tolist(), counts[order].tolist()))
+
+    def get_clade_trait_averages(self, ancestor_id, living_only=True):
+        """
+        Mean traits of the descendants of an organism, itself included, and
+        how many there are.
+        """
+        ancestor_row = self.get_rows_of_ids([ancestor_id])[0]
+        if ancestor_row == Phylogeny.NO_ROW:
+            raise KeyError("No organism " + str(ancestor_id) + " in the phylogeny")
+        rows = self.get_living_rows() if living_only else np.flatnonzero(~self.pruned)
+        members = rows[self.get_ancestors_at_depth(rows, self.depth[ancestor_row]) == ancestor_row]
+        averages = {trait: float(getattr(self, trait)[members].mean()) if len(members) else None
+                    for trait in Phylogeny.TRAITS}
+        averages["size"] = len(members)
+        return averages
@@ -0,0 +1,296 @@
+import math
+import numpy as np
+from blob import Blob
+from column_store import Column, ColumnStore, SlotMap
+from kernels import NumpyKernels
+
+
+class Population(ColumnStore):
+    """
+    Columnar store of every living organism, one row per organism.
+    Row indices are only valid until the next update, which compacts out
+    the dead; handles stay valid for as long as the organism lives.
+    """
+    NOT_DEAD = -1
+    NO_PARENT = -1
+    STARVED = 0
+    KILLED = 1
+    CAUSES_OF_DEATH = ("starvation", "killed")
+    # Most random numbers move_steps draws at once
+    MAX_BATCHED_VALUES = 2 ** 20
+
+    COLUMN_TYPES = {
+        "id": (np.int64, ()),
+        "parent_id": (np.int64, ()),
+        "founder_id": (np.int64, ()),
+        "position": (np.float64, (2,)),
+        "angle": (np.float64, ()),
+        "speed": (np.float64, ()),
+        "radius": (np.float64, ()),
+        "energy": (np.float64, ()),
+        "starting_energy": (np.float64, ()),
+        "eye_width": (np.float64, ()),
+        "time_of_birth": (np.int64, ()),
+        "time_of_death": (np.int64, ()),
+        "cause_of_death": (np.int8, ()),
+        "next_speed": (np.float64, ()),
+        "next_radius": (np.float64, ()),
+        "next_energy": (np.float64, ()),
+        "next_energy_requirement": (np.float64, ())
+    }
+
+    id = Column()
+    parent_id = Column()
+    founder_id = Column()
+    position = Column()
+    angle = Column()
+    speed = Column()
+    radius = Column()
+    energy = Column()
+    starting_energy = Column()
+    eye_width = Column()
+    time_of_birth = Column()
+    time_of_death = Column()
+    cause_of_death = Column()
+    next_speed = Column()
+    next_radius = Column()
+    next_energy = Column()
+    next_energy_requirement = Column()
+
+    def __init__(self, parameters, random_streams, kernels=NumpyKernels):
+        super().__init__()
+        self.parameters = parameters
+        self.random_streams = random_streams
+        self.kernels = kernels
+        self.number_of_blobs_created = 0
+        self.birth_callbacks = []
+        self.death_callbacks = []
+
+    def add_birth_callback(self, callback):
+        """
+        callback(population, rows) is called with the rows of every batch of
+        new organisms, once they are fully initialised.
+        """
+        self.birth_callbacks += [callback]
+
+    def add_death_callback(self, callback):
+        """
+        callback(population, rows) is called with the rows of the dead just
+        before they are removed.
+        """
+        self.death_callbacks += [callback]
+
+    def get_state(self):
+        state = super().get_state()
+        state["number_of_blobs_created"] = np.array(self.number_of_blobs_created)
+        return state
+
+    def set_state(self, state: dict):
+        state = dict(state)
+        # Checkpoints from before parents and causes of death were recorded
+        state.setdefault("parent_id", np.full(len(state["id"]), Population.NO_PARENT))
+        state.setdefault("founder_id", state["id"])
+        state.setdefault("cause_of_death", np.zeros(len(state["id"]), dtype=np.int8))
+        super().set_state(state)
+        self.number_of_blobs_created = int(state["number_of_blobs_created"])
+
+    def copy(self):
+        population = Population(self.parameters, self.random_streams, self.kernels)
+        population.set_state(self.get_state())
+        population.copy_handles(self)
+        return population
+
+    def add_blobs(self, number_of_new_blobs, time_of_birth=0, position=None, angle=None, speed=None,
+                  energy=None, radius=None, parent_id=NO_PARENT, founder_id=None):
+        """
+        Organisms without a parent found their own lineage.
+        """
+        if number_of_new_blobs <= 0:
+            return slice(self.size, self.size)
+        new = self.append_rows(number_of_new_blobs)
+
+        self.columns["id"][new] = np.arange(self.number_of_blobs_created,
+                                            self.number_of_blobs_created + number_of_new_blobs)
+        self.number_of_blobs_created += number_of_new_blobs
+        self.columns["parent_id"][new] = parent_id
+        self.columns["founder_id"][new] = self.columns["id"][new] if founder_id is None else founder_id
+        self.columns["time_of_birth"][new] = time_of_birth
+        self.columns["time_of_death"][new] = Population.NOT_DEAD
+        random = self.random_streams.mutation
+        self.columns["eye_width"][new] = 0.5 * random.random(number_of_new_blobs) + 0.3
+
+        if position is None:
+            position = random.random((number_of_new_blobs, 2))
+        self.columns["position"][new] = position
+
+        if angle is None:
+            angle = random.random(number_of_new_blobs) * 2 * math.pi
+        self.columns["angle"][new] = angle
+
+        speed_extrema = self.parameters.blob_speed_extrema
+        if speed is None:
+            speed = speed_extrema["minimum"] + \
+                    random.random(number_of_new_blobs) * (speed_extrema["maximum"] - speed_extrema["minimum"])
+        self.columns["speed"][new] = np.clip(speed, speed_extrema["minimum"], speed_extrema["maximum"])
+
+        radius_extrema = self.parameters.blob_radius_extrema
+        if radius is None:
+            radius = radius_extrema["minimum"] + \
+                     random.random(number_of_new_blobs) * (radius_extrema["maximum"] - radius_extrema["minimum"])
+        self.columns["radius"][new] = np.clip(radius, radius_extrema["minimum"], radius_extrema["maximum"])
+
+        if energy is None:
+            energy = Blob.DEFAULT_STARTING_ENERGY_PER_RADIUS_SQUARED * self.columns["radius"][new] ** 2
+        self.columns["energy"][new] = energy
+        self.columns["starting_energy"][new] = self.columns["energy"][new]
+
+        self.make_next_offspring_data(np.arange(new.start, new.stop))
+        for callback in self.birth_callbacks:
+            callback(self, new)
+        return new
+
+    def make_next_offspring_data(self, indices):
+        radius = self.radius[indices]
+        starting_energy = self.starting_energy[indices]
+        speed = self.speed[indices]
+        mutation_parameters = self.parameters.blob_mutation_parameters
+        radius_noise, starting_energy_noise, speed_noise = \
+            self.random_streams.mutation.standard_normal((3, len(radius)))
+
+        next_radius = np.maximum(
+            radius + mutation_parameters["radius"] * radius * radius_noise,
+            self.parameters.blob_radius_extrema["minimum"]
+        )
+        next_starting_energy = np.maximum(
+            starting_energy + mutation_parameters["starting_energy"] * starting_energy * starting_energy_noise,
+            0
+        )
+        self.next_speed[indices] = speed + mutation_parameters["speed"] * speed * speed_noise
+        self.next_radius[indices] = next_radius
+        self.next_energy[indices] = next_starting_energy
+        self.next_energy_requirement[indices] = Blob.reproduction_energy_requirement(next_starting_energy,
+                                                                                      next_radius)
+
+    def update(self, current_time: int):
+        self.kernels.move(self.position, self.angle, self.speed, self.radius, self.energy, self.draw_angle_noise())
+        self.mark_starved(current_time)
+
+    def draw_angle_noise(self):
+        return self.random_streams.movement.normal(0, Blob.ANGLE_PERTURBATION_RATE, self.size)
+
+    def move_steps(self, number_of_steps):
+        """
+        The movement and metabolism of number_of_steps updates, without
+        marking the starved. Noise for several steps is drawn at once, which
+        gives the same numbers as drawing it step by step.
+        """
+        steps_per_batch = max(1, Population.MAX_BATCHED_VALUES // max(1, self.size))
+        for first_step in range(0, number_of_steps, steps_per_batch):
+            steps = min(steps_per_batch, number_of_steps - first_step)
+            angle_noise = self.random_streams.movement.normal(0, Blob.ANGLE_PERTURBATION_RATE, (steps, self.size))
+            self.kernels.move_steps(self.position, self.angle, self.speed, self.radius, self.energy, angle_noise)
+
+    def get_steps_before_starving(self):
+        """
+        For each organism, a number of steps it is sure to survive on the
+        energy it has, allowing for rounding in the repeated subtraction.
+        """
+        metabolic_cost = 0.5 * self.speed * self.speed * self.get_mass()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            steps = np.floor(self.energy / metabolic_cost * (1 - 1e-6)) - 1
+        return np.maximum(np.nan_to_num(steps, nan=0.), 0)
+
+    def mark_starved(self, current_time: int):
+        starved = (self.energy <= 0) & ~self.is_dead()
+        self.time_of_death[starved] = current_time
+        self.cause_of_death[starved] = Population.STARVED
+
+    def kill(self, handle, current_time=0):
+        """
+        Marks an organism dead in O(1). It is removed at the next update.
+        """
+        row = self.get_row(handle)
+        self.time_of_death[row] = current_time
+        self.cause_of_death[row] = Population.KILLED
+
+    def is_dead(self):
+        return self.time_of_death != Population.NOT_DEAD
+
+    def remove_dead(self):
+        dead = self.is_dead()
+        number_of_dead = int(np.count_nonzero(dead))
+        if number_of_dead:
+            for callback in self.death_callbacks:
+                callback(self, np.flatnonzero(dead))
+            self.keep(~dead)
+        return number_of_dead
+
+    def produce_offspring(self, current_time: int):
+        """
+        Every parent has as many offspring as its energy affords, each one
+        costing the energy requirement of the offspring data drawn after its
+        older sibling was born. Parents have one child per round, so each
+        round is a handful of array operations and there are only as many
+        rounds as the largest litter.
+        """
+        parents = self.select_parents(np.arange(self.size))
+        litters = []
+        while len(parents) > 0:
+            litters += [(parents, self.next_speed[parents], self.next_radius[parents], self.next_energy[parents])]
+            self.energy[parents] -= self.next_energy_requirement[parents]
+            self.make_next_offspring_data(parents)
+            parents = self.select_parents(parents)
+        if not litters:
+            return slice(self.size, self.size)
+
+        offspring_parent, offspring_speed, offspring_radius, offspring_energy = \
+            (np.concatenate(values) for values in zip(*litters))
+        by_parent = np.argsort(offspring_parent, kind="stable")
+        return self.add_blobs(
+            len(by_parent),
+            time_of_birth=current_time,
+            position=self.position[offspring_parent[by_parent]],
+            speed=offspring_speed[by_parent],
+            energy=offspring_energy[by_parent],
+            radius=offspring_radius[by_parent],
+            parent_id=self.id[offspring_parent[by_parent]],
+            founder_id=self.founder_id[offspring_parent[by_parent]]
+        )
+
+    def select_parents(self, candidates):
+        return self.kernels.select_parents(self.energy, self.next_energy_requirement, self.starting_energy, candidates)
+
+    def restrict_to_extrema(self):
+        speed_extrema = self.parameters.blob_speed_extrema
+        radius_extrema = self.parameters.blob_radius_extrema
+        self.speed = np.clip(self.speed, speed_extrema["minimum"], speed_extrema["maximum"])
+        self.radius = np.clip(self.radius, radius_extrema["minimum"], radius_extrema["maximum"])
+
+    def get_mass(self):
+        return self.radius ** 2 * Blob.MASS_TO_RADIUS_SQUARED
+
+    def get_capacity_for_birth(self):
+        return self.energy / (self.next_energy_requirement + self.starting_energy)
+
+    def get_eye_positions(self):
+        """
+        Left and right eye positions of every organism, as two (n, 2) arrays.
+        """
+        offset = self.radius[:, np.newaxis] / 2
+        left_angle = self.angle + self.eye_width
+        right_angle = self.angle - self.eye_width
+        return self.position + offset * np.column_stack((np.cos(left_angle), np.sin(left_angle))), \
+            self.position + offset * np.column_stack((np.cos(right_angle), np.sin(right_angle)))
+
+    def blob(self, index):
+        return Blob(self, int(self.handle[index]))
+
+    def blobs(self):
+        """
+        Views of the organisms alive now. Safe to iterate while organisms are
+        born or die: views of those removed meanwhile are skipped, and those
+        born meanwhile are not included.
+        """
+        for handle in self.handle.tolist():
+            if self.slot_map.get_rows(handle) != SlotMap.NO_ROW:
+                yield Blob(self, handle)
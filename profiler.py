@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+
+
+class _NoOpPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        return False
+
+
+class NullProfiler:
+    """
+    Stands in for a TickProfiler when profiling is off, so that the
+    instrumented code costs no more than a few no-op calls per tick.
+    """
+    enabled = False
+    NO_OP_PHASE = _NoOpPhase()
+
+    def start_tick(self):
+        pass
+
+    def end_tick(self, steps=1):
+        pass
+
+    def phase(self, name):
+        return NullProfiler.NO_OP_PHASE
+
+    def count(self, name, number):
+        pass
+
+
+class _Phase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception_info):
+        self.profiler.tick_times[self.name] = self.profiler.tick_times.get(self.name, 0.) + \
+                                              time.perf_counter() - self.start
+        return False
+
+
+class TickProfiler:
+    """
+    Records the wall time of each phase of Environment.iterate and event
+    counts per tick, keeping the last `window` ticks for rolling percentiles.
+    """
+    enabled = True
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.phase_times = {}
+        self.counts = {}
+        self.totals = {}
+        self.ticks = 0
+        self.tick_times = {}
+        self.tick_counts = {}
+
+    def start_tick(self):
+        self.tick_times = {}
+        self.tick_counts = {}
+        self.tick_start = time.perf_counter()
+
+    def end_tick(self, steps=1):
+        """
+        A tick that ran several fused time steps is recorded as that many
+        steps sharing its times and counts evenly, so figures stay per step.
+        """
+        self.tick_times['total'] = time.perf_counter() - self.tick_start
+        with self.lock:
+            self.ticks += steps
+            for name, seconds in self.tick_times.items():
+                self.phase_times.setdefault(name, deque(maxlen=self.window)).extend([seconds / steps] * steps)
+            for name in set(self.counts) | set(self.tick_counts):
+                number = self.tick_counts.get(name, 0)
+                self.counts.setdefault(name, deque(maxlen=self.window)).extend([number / steps] * steps)
+                self.totals[name] = self.totals.get(name, 0) + number
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def count(self, name, number):
+        self.tick_counts[name] = self.tick_counts.get(name, 0) + number
+
+    def get_phase_percentiles(self):
+        """
+        {phase: {percentile: seconds}} over the recorded window.
+        """
+        with self.lock:
+            phase_times = {name: np.array(times) for name, times in self.phase_times.items()}
+        return {name: dict(zip(TickProfiler.PERCENTILES, np.percentile(times, TickProfiler.PERCENTILES)))
+                for name, times in phase_times.items()}
+
+    def get_count_percentiles(self):
+        """
+        {counter: {percentile: count per tick}} over the recorded window.
+        """
+        with self.lock:
+            counts = {name: np.array(numbers) for name, numbers in self.counts.items()}
+        return {name: dict(zip(TickProfiler.PERCENTILES, np.percentile(numbers, TickProfiler.PERCENTILES)))
+                for name, numbers in counts.items()}
+
+    def get_totals(self):
+        with self.lock:
+            return dict(self.totals)
+
+    def summary_rows(self):
+        """
+        Rows of (name, p50, p90, p99, unit) for every phase and counter.
+        """
+        rows = []
+        for name, percentiles in sorted(self.get_phase_percentiles().items()):
+            rows += [(name,) + tuple(1000 * percentiles[p] for p in TickProfiler.PERCENTILES) + ("ms",)]
+        for name, percentiles in sorted(self.get_count_percentiles().items()):
+            rows += [(name,) + tuple(percentiles[p] for p in TickProfiler.PERCENTILES) + ("per tick",)]
+        return rows
+
+    @staticmethod
+    def format_value(value, unit):
+        return "{:.3f}".format(value) if unit == "ms" else "{:.0f}".format(value)
+
+    def summary(self):
+        lines = ["{:<26}{:>14}{:>14}{:>14}".format("last {} ticks".format(min(self.ticks, self.window)),
+                                                   "p50", "p90", "p99")]
+        for name, p50, p90, p99, unit in self.summary_rows():
+            lines += ["{:<26}{:>14}{:>14}{:>14} {}".format(
+                name, *(TickProfiler.format_value(value, unit) for value in (p50, p90, p99)), unit)]
+        return "\n".join(lines)
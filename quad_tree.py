@@ -1,31 +1,28 @@
 from typing import List, Any
 from helpers import str_an_array
+from spatial_index import Rectangle, SpatialIndex, bounding_boxes
 
 
-class Rectangle:
-    def __init__(self, x, y, width, height):
-        self.height = height
-        self.width = width
-        self.x = x
-        self.y = y
+class QuadTreeEntry:
+    def __init__(self, item, bounding_box: Rectangle):
+        self.item = item
+        self.bounding_box = bounding_box
 
-    def rectangle_area(self):
-        return self.height * self.width
-
-    def copy(self):
-        return Rectangle(self.x, self.y, self.width, self.height)
+    def __str__(self):
+        return str(self.item)
 
 
-class QuadTree:
+class QuadTree(SpatialIndex):
     nodes: List[Any]
     MAX_OBJECTS = 5
     MAX_LEVELS = 5
 
-    def __init__(self, p_bounds, p_level=1):
+    def __init__(self, p_bounds, p_level=1, periodic=False):
         self.level = p_level
         self.objects = []
         self.bounds = p_bounds
         self.nodes = []
+        self.periodic = periodic
 
     def clear(self):
         self.objects.clear()
@@ -70,21 +67,43 @@ class QuadTree:
         return indices
 
     def remove(self, object_to_remove):
-        index = self.get_index(object_to_remove.bounding_box)
-        if index != -1:
-            self.nodes[index].remove(object_to_remove)
+        if self.has_nodes():
+            for node in self.nodes:
+                node.remove(object_to_remove)
         else:
-            self.objects.remove(object_to_remove)
+            self.objects = [entry for entry in self.objects if entry.item != object_to_remove]
+
+    def insert(self, new_object, bounding_box: Rectangle = None):
+        if bounding_box is None:
+            bounding_box = new_object.bounding_box
+        for part in self.parts_in_bounds(bounding_box):
+            self.insert_entry(QuadTreeEntry(new_object, part))
 
-    def insert(self, new_object):
+    def parts_in_bounds(self, p_rect: Rectangle):
+        if self.periodic:
+            return p_rect.wrapped_parts()
+        return [p_rect]
+
+    def insert_entry(self, entry: QuadTreeEntry):
         if self.has_nodes():
-            indices = self.get_index(new_object.bounding_box)
+            indices = self.get_index(entry.bounding_box)
             for index in indices:
-                self.nodes[index].insert(new_object)
+                self.nodes[index].insert_entry(entry)
         else:
-            self.objects.append(new_object)
+            self.objects.append(entry)
             self.split_if_needed()
 
+    def rebuild(self, positions, radii, items=None):
+        self.clear()
+        if items is None:
+            items = range(len(radii))
+        for item, bounding_box in zip(items, bounding_boxes(positions, radii)):
+            for part in self.parts_in_bounds(bounding_box):
+                self.insert_entry(QuadTreeEntry(item, part))
+
+    def get_number_of_nodes(self):
+        return 1 + sum(node.get_number_of_nodes() for node in self.nodes)
+
     def has_nodes(self):
         return len(self.nodes) != 0
 
@@ -99,7 +118,7 @@ class QuadTree:
         while len(self.objects) > 0:
             indices = self.get_index(self.objects[0].bounding_box)
             for index in indices:
-                self.nodes[index].insert(self.objects[0])
+                self.nodes[index].insert_entry(self.objects[0])
             self.objects.pop(0)
 
     def retrieve_close_objects(self, p_rect, close_objects):
@@ -108,7 +127,13 @@ class QuadTree:
             for index in indices:
                 self.nodes[index].retrieve_close_objects(p_rect, close_objects)
         else:
-            close_objects += self.objects
+            close_objects += [entry.item for entry in self.objects]
+
+    def query(self, p_rect: Rectangle):
+        close_objects = []
+        for part in self.parts_in_bounds(p_rect):
+            self.retrieve_close_objects(part, close_objects)
+        return list(dict.fromkeys(close_objects))
 
     def __str__(self):
         if self.has_nodes():
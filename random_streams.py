@@ -0,0 +1,32 @@
+import numpy as np
+
+
+class RandomStreams:
+    """
+    Independent random number generators for each source of randomness in
+    an Environment, all spawned from one seed so that a seed fixes a run.
+    """
+
+    def __init__(self, seed=None):
+        self.seed_sequence = np.random.SeedSequence(seed)
+        movement_seed, mutation_seed, food_seed = self.seed_sequence.spawn(3)
+        self.movement = np.random.default_rng(movement_seed)
+        self.mutation = np.random.default_rng(mutation_seed)
+        self.food = np.random.default_rng(food_seed)
+
+    def get_entropy(self):
+        return self.seed_sequence.entropy
+
+    def get_state(self):
+        return {
+            'entropy': self.get_entropy(),
+            'movement': self.movement.bit_generator.state,
+            'mutation': self.mutation.bit_generator.state,
+            'food': self.food.bit_generator.state
+        }
+
+    def set_state(self, state: dict):
+        self.seed_sequence = np.random.SeedSequence(state['entropy'])
+        self.movement.bit_generator.state = state['movement']
+        self.mutation.bit_generator.state = state['mutation']
+        self.food.bit_generator.state = state['food']
@@ -0,0 +1,125 @@
+import threading
+import numpy as np
+from environment import Environment
+from statistics import EnvironmentStatistics
+
+
+class MultiResolutionHistory:
+    """
+    Bounded history of a vector of values over time. Level 0 keeps the
+    latest `capacity` samples at full resolution; every `factor` samples
+    reaching a level are averaged into one sample of the next level, so
+    level k covers factor^k times as long a span in the same memory. The
+    oldest samples of the coarsest level are dropped.
+    """
+
+    def __init__(self, number_of_values, capacity=1000, levels=4, factor=10):
+        self.capacity = capacity
+        self.factor = factor
+        # Column 0 holds the time, the rest the values
+        self.samples = np.zeros((levels, capacity, 1 + number_of_values))
+        self.sizes = np.zeros(levels, dtype=np.int64)
+        self.ends = np.zeros(levels, dtype=np.int64)
+        self.pending = [[] for _ in range(levels)]
+        self.number_of_samples = 0
+
+    def append(self, time, values):
+        self.number_of_samples += 1
+        self.append_to_level(0, np.concatenate(([time], values)))
+
+    def append_to_level(self, level, sample):
+        self.samples[level, self.ends[level]] = sample
+        self.ends[level] = (self.ends[level] + 1) % self.capacity
+        self.sizes[level] = min(self.sizes[level] + 1, self.capacity)
+        if level + 1 == len(self.samples):
+            return
+        self.pending[level] += [sample]
+        if len(self.pending[level]) == self.factor:
+            aggregate = np.mean(self.pending[level], axis=0)
+            self.pending[level] = []
+            self.append_to_level(level + 1, aggregate)
+
+    def get_level(self, level):
+        """
+        Samples held at one level, oldest first.
+        """
+        if self.sizes[level] < self.capacity:
+            return self.samples[level, :self.sizes[level]].copy()
+        return np.roll(self.samples[level], -self.ends[level], axis=0)
+
+    def get_latest(self, number_of_samples):
+        """
+        The last number_of_samples full resolution samples, or as many as
+        level 0 still holds.
+        """
+        level = self.get_level(0)
+        return level[len(level) - min(number_of_samples, len(level)):]
+
+    def get_history(self):
+        """
+        Everything held, oldest first, each span at the finest resolution
+        still available for it.
+        """
+        parts = []
+        start_of_finer = np.inf
+        for level in range(len(self.samples)):
+            samples = self.get_level(level)
+            samples = samples[samples[:, 0] < start_of_finer]
+            if len(samples):
+                parts = [samples] + parts
+                start_of_finer = samples[0, 0]
+        if not parts:
+            return np.zeros((0, self.samples.shape[2]))
+        return np.concatenate(parts)
+
+
+class StatisticsRecorder:
+    """
+    Samples EnvironmentStatistics every snapshot_interval steps from a data
+    callback on the simulation thread, into a MultiResolutionHistory so
+    memory stays flat however long the simulation runs.
+    """
+
+    def __init__(self, environment: Environment, statistics: dict = None, snapshot_interval=100,
+                 capacity=1000, levels=4, factor=10):
+        self.environment = environment
+        self.statistics = EnvironmentStatistics.all() if statistics is None else statistics
+        self.names = list(self.statistics)
+        self.snapshot_interval = snapshot_interval
+        self.lock = threading.Lock()
+        self.history = MultiResolutionHistory(len(self.names), capacity, levels, factor)
+
+        self.environment.add_data_callback(self.record_snapshot)
+
+    def record_snapshot(self):
+        if self.environment.current_time % self.snapshot_interval != 0:
+            return
+        values = EnvironmentStatistics.measure(self.environment, self.statistics.values())
+        with self.lock:
+            self.history.append(self.environment.current_time, values)
+
+    def get_number_of_samples(self):
+        with self.lock:
+            return self.history.number_of_samples
+
+    def get_samples_since(self, number_of_samples_seen):
+        """
+        (samples recorded after the first number_of_samples_seen, total
+        number of samples recorded) at full resolution, as {name: array}
+        including 'time'.
+        """
+        with self.lock:
+            total = self.history.number_of_samples
+            samples = self.history.get_latest(total - number_of_samples_seen)
+        return self.to_columns(samples), total
+
+    def get_history(self):
+        with self.lock:
+            samples = self.history.get_history()
+        return self.to_columns(samples)
+
+    def to_columns(self, samples):
+        columns = {'time': samples[:, 0]}
+        for i, name in enumerate(self.names):
+            columns[name] = samples[:, 1 + i]
+        return columns
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+class RegrowthModel:
+    """
+    Continuous food regrowth over a cells x cells map of the unit square.
+    Every time step, each cell spawns a Poisson distributed number of food
+    items at uniform positions within it. Its rate comes from the resource
+    map and falls linearly to zero as the cell fills up to its carrying
+    capacity. All cells are drawn together in one batch.
+    """
+
+    def __init__(self, rates, carrying_capacity=0):
+        self.rates = np.asarray(rates, dtype=float)
+        self.cells_per_side = self.rates.shape[0]
+        self.carrying_capacity = carrying_capacity
+
+    @staticmethod
+    def from_parameters(parameters: dict):
+        """
+        A uniform map when parameters['patches'] is 0, otherwise Gaussian
+        patches placed by parameters['patch_seed'], so the same parameters
+        always give the same map.
+        """
+        cells_per_side = int(parameters['cells'])
+        if parameters['patches'] == 0:
+            resource_map = np.ones((cells_per_side, cells_per_side))
+        else:
+            resource_map = RegrowthModel.make_patchy_map(cells_per_side, int(parameters['patches']),
+                                                         parameters['patch_radius'], parameters['patch_seed'])
+        rates = parameters['rate'] * resource_map / resource_map.sum()
+        return RegrowthModel(rates, parameters['carrying_capacity'])
+
+    @staticmethod
+    def make_patchy_map(cells_per_side, number_of_patches, patch_radius, seed):
+        centres = np.random.default_rng(seed).random((number_of_patches, 2))
+        cell_centres = (np.arange(cells_per_side) + 0.5) / cells_per_side
+        x_separation = cell_centres[np.newaxis, :, np.newaxis] - centres[:, 0, np.newaxis, np.newaxis]
+        y_separation = cell_centres[np.newaxis, np.newaxis, :] - centres[:, 1, np.newaxis, np.newaxis]
+        x_separation -= np.round(x_separation)
+        y_separation -= np.round(y_separation)
+        return np.exp(-(x_separation ** 2 + y_separation ** 2) / (2 * patch_radius ** 2)).sum(axis=0)
+
+    def get_cells(self, positions):
+        cell_coordinates = np.clip((positions * self.cells_per_side).astype(np.int64), 0, self.cells_per_side - 1)
+        return cell_coordinates[:, 0] * self.cells_per_side + cell_coordinates[:, 1]
+
+    def get_rates(self, food_positions):
+        rates = self.rates.ravel()
+        if self.carrying_capacity <= 0:
+            return rates
+        food_per_cell = np.bincount(self.get_cells(food_positions), minlength=len(rates))
+        return rates * np.clip(1 - food_per_cell / self.carrying_capacity, 0, 1)
+
+    def spawn_positions(self, food_positions, random):
+        """
+        Positions of the food spawned this time step.
+        """
+        counts = random.poisson(self.get_rates(food_positions))
+        cells = np.repeat(np.arange(len(counts)), counts)
+        cell_coordinates = np.column_stack((cells // self.cells_per_side, cells % self.cells_per_side))
+        return (cell_coordinates + random.random((len(cells), 2))) / self.cells_per_side
@@ -0,0 +1,100 @@
+import csv
+import os
+import time
+import numpy as np
+from checkpoint import Checkpointer
+from environment import Environment
+from statistics import EnvironmentStatistics
+
+
+class HeadlessRunner:
+    """
+    Runs an Environment without any GUI, sampling EnvironmentStatistics
+    every snapshot_interval steps.
+    """
+
+    def __init__(self, environment: Environment, statistics: dict = None, snapshot_interval=100,
+                 checkpointer: Checkpointer = None):
+        self.environment = environment
+        self.checkpointer = checkpointer
+        self.statistics = EnvironmentStatistics.all() if statistics is None else statistics
+        self.snapshot_interval = snapshot_interval
+        self.series = {'time': []}
+        for name in self.statistics:
+            self.series[name] = []
+
+        self.steps_run = 0
+        self.seconds_running = 0.
+
+        self.environment.add_data_callback(self.record_snapshot)
+
+    def record_snapshot(self):
+        if self.environment.current_time % self.snapshot_interval == 0:
+            self.series['time'] += [self.environment.current_time]
+            for name, statistic in self.statistics.items():
+                self.series[name] += [statistic['function'](self.environment)]
+
+    def run(self, steps):
+        """
+        Runs steps steps with Environment.advance, so other data callbacks
+        are also only called every snapshot_interval steps.
+        """
+        start = time.perf_counter()
+        start_time = self.environment.current_time
+        try:
+            if self.checkpointer is None:
+                self.environment.advance(steps, self.snapshot_interval)
+            else:
+                self.checkpointer.advance(self.environment, steps, self.snapshot_interval)
+        finally:
+            self.steps_run += self.environment.current_time - start_time
+            self.seconds_running += time.perf_counter() - start
+
+    def get_steps_per_second(self):
+        if self.seconds_running == 0:
+            return 0.
+        return self.steps_run / self.seconds_running
+
+    def write(self, path):
+        write_series(self.series, path)
+
+
+def write_csv(series: dict, path):
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(list(series))
+        writer.writerows(zip(*series.values()))
+
+
+def write_npz(series: dict, path):
+    np.savez_compressed(path, **{name: np.asarray(values) for name, values in series.items()})
+
+
+def write_parquet(series: dict, path):
+    import pyarrow
+    import pyarrow.parquet
+    pyarrow.parquet.write_table(pyarrow.table({name: np.asarray(values) for name, values in series.items()}), path)
+
+
+SERIES_WRITERS = {
+    '.csv': write_csv,
+    '.npz': write_npz,
+    '.parquet': write_parquet
+}
+
+
+def check_output_path(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in SERIES_WRITERS:
+        raise ValueError("Unsupported output format '" + extension + "', expected one of " +
+                         ", ".join(SERIES_WRITERS))
+    if extension == '.parquet':
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Writing .parquet files requires pyarrow; use .csv or .npz instead")
+
+
+def write_series(series: dict, path):
+    check_output_path(path)
+    SERIES_WRITERS[os.path.splitext(path)[1].lower()](series, path)
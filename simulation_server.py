@@ -0,0 +1,96 @@
+import re
+import threading
+from checkpoint import Checkpointer
+from environment import Environment, EnvironmentSnapshot
+from recorder import StatisticsRecorder
+from simulation_worker import SimulationWorker
+from statistics import EnvironmentStatistics
+
+
+class SharedSimulation:
+    """
+    One Environment iterated by one SimulationWorker, watched by any number
+    of subscribers. Each published EnvironmentSnapshot is taken once and
+    handed to every subscriber, which must only read it, and changes to the
+    environment go through the worker's command queue, so the cost of the
+    simulation does not grow with the number of viewers. The worker is
+    paused while nobody is watching and resumed by the next subscriber.
+    """
+    TARGET_FPS = 20
+    HISTORY_CAPACITY = 1000
+
+    def __init__(self, environment: Environment, checkpointer: Checkpointer = None, target_fps=TARGET_FPS):
+        self.environment = environment
+        self.subscribers = []
+        self.subscribers_lock = threading.Lock()
+        self.latest_snapshot = None
+        self.paused_without_subscribers = False
+        self.recorder = StatisticsRecorder(environment, {
+            'number_of_foods': EnvironmentStatistics.number_of_foods,
+            'number_of_blobs': EnvironmentStatistics.number_of_blobs
+        }, capacity=SharedSimulation.HISTORY_CAPACITY)
+        self.worker = SimulationWorker(environment, self.broadcast, target_fps=target_fps,
+                                       checkpointer=checkpointer, sampling_interval=self.recorder.snapshot_interval)
+        self.worker.start()
+
+    def broadcast(self, snapshot: EnvironmentSnapshot):
+        # Called from the worker thread
+        with self.subscribers_lock:
+            self.latest_snapshot = snapshot
+            subscribers = list(self.subscribers)
+        for publish_function in subscribers:
+            publish_function(snapshot)
+
+    def subscribe(self, publish_function):
+        """
+        publish_function is called from the worker thread with every
+        snapshot from now on, starting with the latest one.
+        """
+        with self.subscribers_lock:
+            self.subscribers += [publish_function]
+            snapshot = self.latest_snapshot
+            if self.paused_without_subscribers:
+                self.paused_without_subscribers = False
+                self.worker.play()
+                snapshot = None
+        if snapshot is None:
+            self.worker.publish()
+        else:
+            publish_function(snapshot)
+
+    def unsubscribe(self, publish_function):
+        with self.subscribers_lock:
+            if publish_function in self.subscribers:
+                self.subscribers.remove(publish_function)
+            if not self.subscribers and self.worker.is_playing():
+                self.paused_without_subscribers = True
+                self.worker.pause()
+
+    def get_number_of_subscribers(self):
+        with self.subscribers_lock:
+            return len(self.subscribers)
+
+    def stop(self):
+        self.worker.stop()
+
+
+MAX_SHARED_SIMULATIONS = 4
+SIMULATION_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+shared_simulations = {}
+shared_simulations_lock = threading.Lock()
+
+
+def get_shared_simulation(name, make_simulation):
+    """
+    The SharedSimulation called name, made with make_simulation(name) the
+    first time it is asked for. Lives as long as the server process, so
+    every session asking for the same name watches the same simulation.
+    """
+    if not SIMULATION_NAME_PATTERN.match(name):
+        raise ValueError("Invalid simulation name '" + name + "'")
+    with shared_simulations_lock:
+        if name not in shared_simulations:
+            if len(shared_simulations) >= MAX_SHARED_SIMULATIONS:
+                raise ValueError("Already running " + str(MAX_SHARED_SIMULATIONS) + " shared simulations")
+            shared_simulations[name] = make_simulation(name)
+        return shared_simulations[name]
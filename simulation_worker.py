@@ -0,0 +1,235 @@
+import queue
+import threading
+import time
+import traceback
+from checkpoint import Checkpointer
+from environment import Environment, EnvironmentSnapshot
+
+
+class SkipForwardJob:
+    """
+    A request to run a number of steps as fast as possible. Progress is
+    reported to progress_function from the worker thread, at most every
+    PROGRESS_INTERVAL seconds and once more when the job ends.
+    """
+    CHUNK_SIZE = 50
+    PROGRESS_INTERVAL = 0.2
+
+    def __init__(self, steps, progress_function=None):
+        self.steps = steps
+        self.progress_function = progress_function
+        self.steps_done = 0
+        self.population = 0
+        self.cancelled = False
+        self.finished = False
+        self.start_time = None
+        self.last_report_time = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def get_steps_per_second(self):
+        if self.start_time is None or self.steps_done == 0:
+            return 0.
+        return self.steps_done / (time.perf_counter() - self.start_time)
+
+    def report_progress(self, force=False):
+        if self.progress_function is None:
+            return
+        now = time.perf_counter()
+        if force or now - self.last_report_time >= SkipForwardJob.PROGRESS_INTERVAL:
+            self.last_report_time = now
+            self.progress_function(self)
+
+
+class SimulationWorker:
+    """
+    Iterates an Environment on a background thread, independently of how
+    fast it can be drawn. After every steps_per_frame iterations it hands
+    an EnvironmentSnapshot to publish_function, and it publishes at most
+    target_fps snapshots a second.
+
+    Anything else touching the environment while the worker is running must
+    hold self.lock, e.g. by going through synchronised, or be handed to the
+    worker with submit. Submitted commands run on the worker thread, in the
+    order they came in, between frames or skip forward chunks, and are
+    published straight away even when paused.
+
+    Steps are run with Environment.advance, so data callbacks are only
+    called every sampling_interval steps.
+    """
+
+    def __init__(self, environment: Environment, publish_function, steps_per_frame=1, target_fps=20,
+                 checkpointer: Checkpointer = None, sampling_interval=1):
+        self.environment = environment
+        self.publish_function = publish_function
+        self.steps_per_frame = steps_per_frame
+        self.target_fps = target_fps
+        self.checkpointer = checkpointer
+        self.sampling_interval = sampling_interval
+
+        self.lock = threading.RLock()
+        self.condition = threading.Condition()
+        self.playing = False
+        self.stopped = False
+        self.job = None
+        self.commands = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def play(self):
+        with self.condition:
+            self.playing = True
+            self.condition.notify_all()
+
+    def pause(self):
+        with self.condition:
+            self.playing = False
+        self.request_publish()
+
+    def is_playing(self):
+        return self.playing
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            if self.job is not None:
+                self.job.cancel()
+            self.condition.notify_all()
+
+    def set_steps_per_frame(self, steps_per_frame):
+        self.steps_per_frame = max(1, int(steps_per_frame))
+        if not self.playing:
+            self.request_publish()
+
+    def skip_forward(self, steps, progress_function=None):
+        """
+        Queues a SkipForwardJob, or returns the one already running. No
+        snapshots are published until it ends, so views jump straight from
+        the state before it to the state after it.
+        """
+        with self.condition:
+            if self.job is None:
+                self.job = SkipForwardJob(steps, progress_function)
+                self.condition.notify_all()
+            return self.job
+
+    def publish(self):
+        with self.lock:
+            snapshot = EnvironmentSnapshot(self.environment, self.playing, self.steps_per_frame)
+        self.publish_function(snapshot)
+
+    def synchronised(self, function):
+        """
+        Wraps function so that it runs between iterations and its effect is
+        published straight away, even when paused.
+        """
+        def synchronised_function(*args, **kwargs):
+            with self.lock:
+                result = function(*args, **kwargs)
+            self.publish()
+            return result
+
+        return synchronised_function
+
+    def submit(self, function, *args, **kwargs):
+        with self.condition:
+            self.commands.put((function, args, kwargs))
+            self.condition.notify_all()
+
+    def request_publish(self):
+        """
+        Has the worker publish a snapshot at its next chance, so that every
+        session sees a change of controls even when paused.
+        """
+        self.submit(lambda: None)
+
+    def queued(self, function):
+        """
+        Wraps function so that calling it submits it to the worker instead.
+        """
+        def queued_function(*args, **kwargs):
+            self.submit(function, *args, **kwargs)
+
+        return queued_function
+
+    def run_commands(self):
+        ran_any = False
+        with self.lock:
+            while not self.commands.empty():
+                function, args, kwargs = self.commands.get()
+                try:
+                    function(*args, **kwargs)
+                except Exception:
+                    # A bad command from one viewer must not stop the simulation for the others
+                    traceback.print_exc()
+                ran_any = True
+        if ran_any:
+            self.publish()
+
+    def iterate(self, steps):
+        with self.lock:
+            if self.checkpointer is None:
+                self.environment.advance(steps, self.sampling_interval)
+            else:
+                self.checkpointer.advance(self.environment, steps, self.sampling_interval)
+
+    def wait_for_work(self):
+        with self.condition:
+            while not (self.stopped or self.playing or self.job is not None or not self.commands.empty()):
+                self.condition.wait()
+
+    def run(self):
+        next_frame_time = time.perf_counter()
+        while True:
+            self.wait_for_work()
+            if self.stopped:
+                return
+            self.run_commands()
+            if self.job is not None:
+                self.run_job(self.job)
+                next_frame_time = time.perf_counter()
+                continue
+
+            if not self.playing:
+                continue
+            try:
+                self.iterate(self.steps_per_frame)
+                self.publish()
+            except Exception:
+                # Pause rather than let the thread die, so the viewers can still inspect and control the simulation
+                traceback.print_exc()
+                self.pause()
+                continue
+
+            next_frame_time += 1 / self.target_fps
+            delay = next_frame_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_frame_time = time.perf_counter()
+
+    def run_job(self, job: SkipForwardJob):
+        job.start_time = job.last_report_time = time.perf_counter()
+        try:
+            while job.steps_done < job.steps and not job.cancelled:
+                self.run_commands()
+                steps = min(SkipForwardJob.CHUNK_SIZE, job.steps - job.steps_done)
+                self.iterate(steps)
+                job.steps_done += steps
+                job.population = len(self.environment.organisms.population)
+                job.report_progress()
+        except Exception:
+            # End the job early instead of killing the thread; the viewers see where it stopped
+            traceback.print_exc()
+            job.cancelled = True
+            with self.condition:
+                self.playing = False
+
+        self.publish()
+        with self.condition:
+            job.finished = True
+            self.job = None
+        job.report_progress(force=True)
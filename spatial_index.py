@@ -0,0 +1,89 @@
+import numpy as np
+from helpers import wrapped_intervals
+
+
+class Rectangle:
+    def __init__(self, x, y, width, height):
+        self.height = height
+        self.width = width
+        self.x = x
+        self.y = y
+
+    def rectangle_area(self):
+        return self.height * self.width
+
+    def copy(self):
+        return Rectangle(self.x, self.y, self.width, self.height)
+
+    def intersects(self, other):
+        return self.x <= other.x + other.width and other.x <= self.x + self.width and \
+               self.y <= other.y + other.height and other.y <= self.y + self.height
+
+    def wrapped_parts(self, period=1):
+        """
+        Splits the rectangle along the edges of the periodic square
+        [0, period) x [0, period) into the pieces that lie inside it.
+        """
+        return [Rectangle(x, y, width, height)
+                for x, width in wrapped_intervals(self.x, self.width, period)
+                for y, height in wrapped_intervals(self.y, self.height, period)]
+
+
+class SpatialIndex:
+    """
+    Interface shared by the spatial indices an Environment can use to find
+    organisms close to a point.
+
+    Items are either inserted one at a time with their bounding box, or
+    bulk loaded with rebuild, in which case item i is the integer i unless
+    an explicit list of items is given.
+
+    A periodic index treats the unit square as a torus, so boxes and queries
+    crossing an edge reappear on the opposite side.
+    """
+    periodic = False
+
+    def insert(self, new_object, bounding_box: Rectangle = None):
+        raise NotImplementedError
+
+    def remove(self, object_to_remove):
+        raise NotImplementedError
+
+    def query(self, p_rect: Rectangle):
+        raise NotImplementedError
+
+    def rebuild(self, positions, radii, items=None):
+        raise NotImplementedError
+
+    def get_number_of_nodes(self):
+        raise NotImplementedError
+
+    def candidate_pairs(self, positions, radii):
+        """
+        Pairs each query circle with every item that could overlap it.
+        Only meaningful when the items are integer indices, as after a
+        rebuild without explicit items. Returns (query indices, item indices).
+        """
+        query_indices = []
+        item_indices = []
+        for query_index, (position, radius) in enumerate(zip(positions, radii)):
+            close_items = self.query(Rectangle(x=position[0] - radius, y=position[1] - radius,
+                                               width=2 * radius, height=2 * radius))
+            query_indices += [query_index] * len(close_items)
+            item_indices += close_items
+        return np.array(query_indices, dtype=np.int64), np.array(item_indices, dtype=np.int64)
+
+
+def bounding_boxes(positions, radii):
+    return [Rectangle(x=position[0] - radius, y=position[1] - radius, width=2 * radius, height=2 * radius)
+            for position, radius in zip(positions, radii)]
+
+
+def expand_ranges(starts, counts):
+    """
+    Flattens the ranges [start, start + count) into one array.
+    Returns (owner of each element, element).
+    """
+    owners = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, np.repeat(starts, counts) + offsets
@@ -1,27 +1,21 @@
 from environment import Environment
-from math import log, log1p
+import numpy as np
 
 
 def number_of_foods_function(environment: Environment):
-    return len(environment.foodage.food_list)
+    return len(environment.foodage)
 
 
 def number_of_blobs_function(environment: Environment):
-    return len(environment.organisms.organism_list)
+    return len(environment.organisms.population)
 
 
 def total_energy_of_blobs(environment: Environment):
-    energy_sum = 0
-    for organism in environment.organisms.organism_list:
-        energy_sum += organism.get_energy()
-    return energy_sum
+    return float(environment.organisms.population.energy.sum())
 
 
 def total_mass_of_blobs(environment: Environment):
-    mass_sum = 0
-    for organism in environment.organisms.organism_list:
-        mass_sum += organism.get_mass()
-    return mass_sum
+    return float(environment.organisms.population.get_mass().sum())
 
 
 class EnvironmentStatistics:
@@ -45,12 +39,28 @@ class EnvironmentStatistics:
         'function': total_mass_of_blobs
     }
 
+    @staticmethod
+    def measure(environment: Environment, statistics):
+        """
+        Values of several statistics at once, as an array.
+        """
+        return np.array([statistic['function'](environment) for statistic in statistics], dtype=float)
 
+    @staticmethod
+    def all():
+        return {name: statistic for name, statistic in vars(EnvironmentStatistics).items()
+                if isinstance(statistic, dict)}
+
+
+# Each maps a Population and the current time to one value per organism
 BlobStatistics = {
-    "radius": lambda blob, env: blob.radius,
-    "age": lambda blob, env: env.current_time - blob.time_of_birth,
-    "speed": lambda blob, env: blob.speed,
-    "time of birth": lambda blob, env: blob.time_of_birth,
-    "log radius": lambda blob, env: log(blob.radius),
-    "log speed": lambda blob, env: log1p(blob.speed)  # adjusted so no division by zero
+    "radius": lambda population, current_time: population.radius,
+    "age": lambda population, current_time: current_time - population.time_of_birth,
+    "speed": lambda population, current_time: population.speed,
+    "time of birth": lambda population, current_time: population.time_of_birth,
+    "log radius": lambda population, current_time: np.log(population.radius),
+    "log speed": lambda population, current_time: np.log1p(population.speed),  # adjusted so no division by zero
+    "energy": lambda population, current_time: population.energy,
+    "starting energy": lambda population, current_time: population.starting_energy,
+    "capacity for birth": lambda population, current_time: population.get_capacity_for_birth()
 }
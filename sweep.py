@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+import numpy as np
+from environment import Environment, SimulationParameters
+from runner import HeadlessRunner
+
+
+def expand_grid(grid: dict):
+    """
+    Every combination of a grid such as {'blob_mutation_parameters.speed': [0.05, 0.1]}.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in product(*(grid[name] for name in names))]
+
+
+def make_run(overrides: dict, seed, steps, number_of_blobs, starting_food_items, snapshot_interval):
+    run = {
+        'overrides': overrides,
+        'seed': seed,
+        'steps': steps,
+        'number_of_blobs': number_of_blobs,
+        'starting_food_items': starting_food_items,
+        'snapshot_interval': snapshot_interval
+    }
+    run['run_id'] = hashlib.sha1(json.dumps(run, sort_keys=True).encode()).hexdigest()[:12]
+    return run
+
+
+def run_single(run: dict, output_directory):
+    """
+    Runs one sweep configuration, writes its statistics series and returns
+    a summary. Runs in a worker process.
+    """
+    environment = Environment(number_of_blobs=run['number_of_blobs'],
+                              starting_food_items=run['starting_food_items'],
+                              parameters=SimulationParameters(run['overrides']),
+                              seed=run['seed'])
+    runner = HeadlessRunner(environment, snapshot_interval=run['snapshot_interval'])
+    runner.run(run['steps'])
+    runner.write(os.path.join(output_directory, run['run_id'] + '.npz'))
+
+    summary = dict(run)
+    summary['steps_per_second'] = runner.get_steps_per_second()
+    summary['final'] = {name: statistic['function'](environment) for name, statistic in runner.statistics.items()}
+    summary['mean'] = {name: float(np.mean(runner.series[name])) if runner.series[name] else None
+                       for name in runner.statistics}
+    return summary
+
+
+class ParameterSweep:
+    """
+    Runs every parameter set with every seed in a process pool, one
+    Environment per run. Summaries are appended to summary.jsonl in the
+    output directory as runs finish, and runs already listed there are
+    skipped, so an interrupted sweep resumes where it stopped.
+    """
+    SUMMARY_FILE = 'summary.jsonl'
+
+    def __init__(self, parameter_sets: [dict], output_directory, seeds=(0,), steps=10000, number_of_blobs=8,
+                 starting_food_items=30, snapshot_interval=100):
+        self.output_directory = output_directory
+        self.runs = [make_run(overrides, seed, steps, number_of_blobs, starting_food_items, snapshot_interval)
+                     for overrides in parameter_sets for seed in seeds]
+        for overrides in parameter_sets:
+            SimulationParameters(overrides)  # fail fast on unknown parameter names
+
+    def get_summary_path(self):
+        return os.path.join(self.output_directory, ParameterSweep.SUMMARY_FILE)
+
+    def completed_run_ids(self):
+        if not os.path.exists(self.get_summary_path()):
+            return set()
+        with open(self.get_summary_path()) as summary_file:
+            return {json.loads(line)['run_id'] for line in summary_file if line.strip()}
+
+    def pending_runs(self):
+        completed = self.completed_run_ids()
+        return [run for run in self.runs if run['run_id'] not in completed]
+
+    def run(self, max_workers=None):
+        """
+        Generator yielding each run's summary as soon as it completes.
+        """
+        os.makedirs(self.output_directory, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run_single, run, self.output_directory) for run in self.pending_runs()]
+            for future in as_completed(futures):
+                summary = future.result()
+                with open(self.get_summary_path(), 'a') as summary_file:
+                    summary_file.write(json.dumps(summary) + '\n')
+                yield summary
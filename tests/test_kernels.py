@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+from blob import Blob
+from environment import Environment
+from helpers import minimum_image
+from kernels import KERNEL_NAMES, NO_EATER, NumpyKernels, get_kernels
+
+# Compiled sines and cosines may differ from NumPy's in the last bit
+TOLERANCE = {'rtol': 1e-12, 'atol': 1e-15}
+
+
+@pytest.fixture(params=KERNEL_NAMES)
+def kernels(request):
+    if request.param == "numba":
+        pytest.importorskip("numba")
+    return get_kernels(request.param)
+
+
+def make_movers(random, number):
+    return {
+        'position': random.random((number, 2)),
+        'angle': random.uniform(-np.pi, np.pi, number),
+        'speed': random.uniform(0.001, Blob.SPEED_EXTREMA['maximum'], number),
+        'radius': random.uniform(Blob.RADIUS_EXTREMA['minimum'], Blob.RADIUS_EXTREMA['maximum'], number),
+        'energy': random.uniform(0.1, 10, number)
+    }
+
+
+def copy_movers(movers):
+    return {name: values.copy() for name, values in movers.items()}
+
+
+def move(kernels, movers, angle_noise):
+    kernels.move(movers['position'], movers['angle'], movers['speed'], movers['radius'], movers['energy'],
+                 angle_noise)
+
+
+def test_move_matches_numpy(kernels):
+    random = np.random.default_rng(0)
+    movers = make_movers(random, 500)
+    expected = copy_movers(movers)
+    angle_noise = random.normal(0, Blob.ANGLE_PERTURBATION_RATE, 500)
+    move(kernels, movers, angle_noise)
+    move(NumpyKernels, expected, angle_noise)
+    for name in movers:
+        np.testing.assert_allclose(movers[name], expected[name], **TOLERANCE)
+    assert np.all((movers['position'] >= 0) & (movers['position'] < 1))
+
+
+def test_move_steps_matches_repeated_move(kernels):
+    random = np.random.default_rng(1)
+    movers = make_movers(random, 300)
+    expected = copy_movers(movers)
+    angle_noise = random.normal(0, Blob.ANGLE_PERTURBATION_RATE, (7, 300))
+    kernels.move_steps(movers['position'], movers['angle'], movers['speed'], movers['radius'], movers['energy'],
+                       angle_noise)
+    for step_noise in angle_noise:
+        move(kernels, expected, step_noise)
+    for name in movers:
+        np.testing.assert_array_equal(movers[name], expected[name])
+
+
+def test_sort_into_cells(kernels):
+    random = np.random.default_rng(2)
+    cells = random.integers(0, 64, 1000)
+    cell_starts, sorted_indices = kernels.sort_into_cells(cells, 64)
+    np.testing.assert_array_equal(cell_starts, np.concatenate(([0], np.cumsum(np.bincount(cells, minlength=64)))))
+    np.testing.assert_array_equal(sorted_indices, np.argsort(cells, kind="stable"))
+
+
+@pytest.mark.parametrize("periodic", [True, False])
+def test_resolve_eaters_matches_brute_force(kernels, periodic):
+    random = np.random.default_rng(3)
+    food_positions, food_radii = random.random((200, 2)), random.uniform(0.001, 0.03, 200)
+    organism_positions, organism_radii = random.random((150, 2)), random.uniform(0.001, 0.06, 150)
+    # A random subset of all pairs, in no particular order
+    food_indices, organism_indices = np.divmod(random.permutation(200 * 150)[:20000], 150)
+    eaters = kernels.resolve_eaters(food_positions, food_radii, organism_positions, organism_radii,
+                                    food_indices, organism_indices, periodic)
+
+    expected = np.full(200, NO_EATER)
+    for food, organism in zip(food_indices, organism_indices):
+        separation = organism_positions[organism] - food_positions[food]
+        if periodic:
+            separation = minimum_image(separation)
+        if organism_radii[organism] > food_radii[food] and \
+                np.hypot(*separation) < organism_radii[organism] + food_radii[food] and \
+                (expected[food] == NO_EATER or organism < expected[food]):
+            expected[food] = organism
+    np.testing.assert_array_equal(eaters, expected)
+
+
+def test_select_parents(kernels):
+    random = np.random.default_rng(4)
+    energy = random.uniform(0, 10, 400)
+    next_energy_requirement = random.uniform(0, 5, 400)
+    starting_energy = random.uniform(0, 5, 400)
+    candidates = np.sort(random.choice(400, 250, replace=False))
+    parents = kernels.select_parents(energy, next_energy_requirement, starting_energy, candidates)
+    np.testing.assert_array_equal(
+        parents, candidates[energy[candidates] >= next_energy_requirement[candidates] + starting_energy[candidates]])
+
+
+def test_seeded_run_matches_numpy(kernels):
+    environments = [Environment(30, 60, seed=7, kernels=name) for name in ("numpy", kernels.name)]
+    for environment in environments:
+        for _ in range(300):
+            environment.iterate()
+    expected, state = (environment.get_state() for environment in environments)
+    assert state.keys() == expected.keys()
+    for name in expected:
+        if expected[name].dtype.kind == 'f':
+            np.testing.assert_allclose(state[name], expected[name], **TOLERANCE, err_msg=name)
+        else:
+            np.testing.assert_array_equal(state[name], expected[name], err_msg=name)
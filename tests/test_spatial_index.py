@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from consumption import candidate_pairs, find_eaters, NO_EATER
+from grid_index import GridIndex
+from helpers import minimum_image
+from quad_tree import QuadTree
+from spatial_index import Rectangle
+
+TRIALS = 20
+
+
+def make_circles(random, number, max_radius):
+    """
+    Half the circles anywhere, half within max_radius of an edge, so that
+    many of them wrap across the boundary of the torus.
+    """
+    positions = random.random((number, 2))
+    near_edge = random.random(number) < 0.5
+    edge_offsets = random.uniform(-max_radius, max_radius, (number, 2)) % 1
+    axis = random.integers(0, 2, number)
+    positions[near_edge, axis[near_edge]] = edge_offsets[near_edge, axis[near_edge]]
+    return positions, random.uniform(0.001, max_radius, number)
+
+
+def brute_force_query(positions, radii, rectangle: Rectangle):
+    half_size = np.array([rectangle.width / 2, rectangle.height / 2])
+    separation = minimum_image(positions - (np.array([rectangle.x, rectangle.y]) + half_size))
+    return set(np.flatnonzero(np.all(np.abs(separation) <= half_size + radii[:, np.newaxis], axis=1)).tolist())
+
+
+def brute_force_overlaps(query_positions, query_radii, item_positions, item_radii):
+    separation = minimum_image(query_positions[:, np.newaxis] - item_positions[np.newaxis])
+    distance = np.sqrt(np.einsum("ijk,ijk->ij", separation, separation))
+    return distance < query_radii[:, np.newaxis] + item_radii[np.newaxis]
+
+
+def brute_force_eaters(food_positions, food_radii, organism_positions, organism_radii):
+    overlaps = brute_force_overlaps(food_positions, food_radii, organism_positions, organism_radii)
+    eligible = overlaps & (organism_radii[np.newaxis] > food_radii[:, np.newaxis])
+    return np.array([row.argmax() if row.any() else NO_EATER for row in eligible])
+
+
+def make_index(name):
+    if name == "grid":
+        return GridIndex(periodic=True)
+    return QuadTree(Rectangle(0, 0, 1, 1), periodic=True)
+
+
+def random_rectangle(random):
+    width, height = random.uniform(0.01, 0.3, 2)
+    x, y = random.uniform(-0.2, 1.2, 2)
+    return Rectangle(x, y, width, height)
+
+
+def test_grid_query_matches_brute_force():
+    random = np.random.default_rng(0)
+    for _ in range(TRIALS):
+        positions, radii = make_circles(random, 200, 0.05)
+        index = make_index("grid")
+        index.rebuild(positions, radii)
+        for _ in range(10):
+            rectangle = random_rectangle(random)
+            assert set(index.query(rectangle)) == brute_force_query(positions, radii, rectangle)
+
+
+def test_periodic_quad_tree_query_finds_every_overlap():
+    random = np.random.default_rng(1)
+    for _ in range(TRIALS):
+        positions, radii = make_circles(random, 200, 0.05)
+        index = make_index("quad_tree")
+        index.rebuild(positions, radii)
+        for _ in range(10):
+            rectangle = random_rectangle(random)
+            found = index.query(rectangle)
+            assert len(found) == len(set(found))
+            assert brute_force_query(positions, radii, rectangle) <= set(found)
+
+
+@pytest.mark.parametrize("index_name", ["grid", "quad_tree"])
+def test_index_candidate_pairs_cover_every_overlap(index_name):
+    random = np.random.default_rng(2)
+    for _ in range(TRIALS):
+        item_positions, item_radii = make_circles(random, 150, 0.05)
+        query_positions, query_radii = make_circles(random, 100, 0.08)
+        index = make_index(index_name)
+        index.rebuild(item_positions, item_radii)
+        query_indices, item_indices = index.candidate_pairs(query_positions, query_radii)
+        pairs = set(zip(query_indices.tolist(), item_indices.tolist()))
+        expected = brute_force_overlaps(query_positions, query_radii, item_positions, item_radii)
+        assert set(zip(*(indices.tolist() for indices in np.nonzero(expected)))) <= pairs
+
+
+def test_sweep_candidate_pairs_cover_every_overlap():
+    random = np.random.default_rng(3)
+    for _ in range(TRIALS):
+        food_positions, food_radii = make_circles(random, 150, 0.02)
+        organism_positions, organism_radii = make_circles(random, 100, 0.05)
+        food_indices, organism_indices = candidate_pairs(food_positions, food_radii, organism_positions,
+                                                         organism_radii, periodic=True)
+        pairs = set(zip(food_indices.tolist(), organism_indices.tolist()))
+        expected = brute_force_overlaps(food_positions, food_radii, organism_positions, organism_radii)
+        assert set(zip(*(indices.tolist() for indices in np.nonzero(expected)))) <= pairs
+
+
+@pytest.mark.parametrize("search", ["sweep", "grid", "quad_tree", "food_index"])
+def test_find_eaters_matches_brute_force(search):
+    random = np.random.default_rng(4)
+    for trial in range(TRIALS):
+        # Fewer organisms than food on even trials, so only those use the food index
+        food_positions, food_radii = make_circles(random, 120, 0.03)
+        organism_positions, organism_radii = make_circles(random, 200 if trial % 2 else 80, 0.05)
+        spatial_index = food_index = None
+        if search in ("grid", "quad_tree"):
+            spatial_index = make_index(search)
+            spatial_index.rebuild(organism_positions, organism_radii)
+        elif search == "food_index":
+            food_index = make_index("grid")
+            food_index.rebuild(food_positions, food_radii)
+        eaters = find_eaters(food_positions, food_radii, organism_positions, organism_radii, spatial_index,
+                             periodic=True, food_index=food_index)
+        np.testing.assert_array_equal(
+            eaters, brute_force_eaters(food_positions, food_radii, organism_positions, organism_radii))